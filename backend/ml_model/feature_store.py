@@ -0,0 +1,172 @@
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from features import FEATURE_SETS, featurize_matches, featurize_state, load_matches, load_match_keys, load_team_stats
+from snapshot import load_snapshot_matches, load_snapshot_team_stats
+
+# Bump whenever a feature definition changes so stale stores are rebuilt instead of appended to
+FEATURE_SCHEMA_VERSION = 1
+
+STORE_DIR = Path(__file__).resolve().parent / "feature_store"
+
+
+def store_path(feature_set, version=FEATURE_SCHEMA_VERSION):
+	return STORE_DIR / f"{feature_set}_features_v{version}.pkl"
+
+
+def load_store(feature_set):
+	path = store_path(feature_set)
+	if not path.exists():
+		return None
+
+	try:
+		return joblib.load(path)
+	except Exception as e:
+		print("Error loading feature store, rebuilding:", e)
+		return None
+
+
+# Date of the newest match in the store, i.e. the training watermark of a model fit on it
+def store_watermark(feature_set):
+	store = load_store(feature_set)
+	return None if store is None else store['watermark']
+
+
+def save_store(store, feature_set):
+	path = store_path(feature_set)
+	path.parent.mkdir(parents=True, exist_ok=True)
+
+	# Write to a temp file first so an interrupted run never leaves a truncated store behind
+	tmp_path = path.with_suffix(".tmp")
+	joblib.dump(store, tmp_path)
+	tmp_path.replace(path)
+
+
+def empty_store(feature_set):
+	return {
+		'feature_set': feature_set,
+		'version': FEATURE_SCHEMA_VERSION,
+		'features': None,
+		'watermark': None,
+		'state': None,
+		# Every featurized match with whether it advanced the head-to-head record, in date order, so the state as of
+		# any earlier date can be rebuilt without reloading matches
+		'ledger': None,
+		# (team, date) of every team_stats_by_date snapshot the rows were built with, and the newest date among them
+		'snapshots': set(),
+		'stats_watermark': None
+	}
+
+
+def empty_features(feature_set):
+	return pd.DataFrame(columns=['match_id', 'date', 'team_a', 'team_b', 'outcome'] + FEATURE_SETS[feature_set])
+
+
+def snapshot_keys(team_stats):
+	df = team_stats.dropna(subset=['team_name', 'date'])
+	dates = pd.to_datetime(df['date']).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+	return set(zip(df['team_name'].astype(str), dates.tolist()))
+
+
+# Earliest ledger date from which a row's nearest team snapshot (TeamStatsIndex "nearest") can differ between the
+# `known` snapshots and the `current` ones, or None when no stored row is affected. A new snapshot can only take over
+# rows past the midpoint to the team's previous one; a team's first snapshot reaches all of its rows
+def snapshot_cutoff(ledger, known, current):
+	if known - current:
+		return ledger['date'].min()
+	added = current - known
+	if not added:
+		return None
+
+	known_dates = {}
+	for team, date in known:
+		known_dates.setdefault(team, []).append(date)
+
+	bounds = {}
+	for team, date in added:
+		earlier = [known_date for known_date in known_dates.get(team, []) if known_date < date]
+		bound = (max(earlier) + date) // 2 if earlier else None
+		if team in bounds and (bounds[team] is None or bound is None):
+			bounds[team] = None
+		else:
+			bounds[team] = min(bounds.get(team, bound), bound) if bound is not None else None
+
+	dates = ledger['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+	affected = np.zeros(len(ledger), dtype=bool)
+	for side in ('team_a', 'team_b'):
+		teams = ledger[side].astype(str).to_numpy()
+		for team, bound in bounds.items():
+			rows = teams == team
+			affected |= rows if bound is None else rows & (dates > bound)
+
+	return ledger['date'][affected].min() if affected.any() else None
+
+
+# Featurizes only what changed since the last run, appends it and returns every stored row: matches the store has not
+# seen, and stored rows whose nearest team snapshot can change now that new snapshots exist (teams are snapshotted
+# weekly, after their matches). Form and head-to-head state depend on match order, so when either reaches back before
+# the watermark every row from that date on is featurized again, continuing from the state rebuilt out of the ledger.
+# The result matches a full build_features over every match.
+# With `snapshot` set (a directory written by snapshot.export_snapshot) no database is touched and cursor may be None
+def update_feature_store(cursor, feature_set, rebuild=False, snapshot=None):
+	store = None if rebuild else load_store(feature_set)
+	if store is not None and 'ledger' not in store:
+		print("Feature store predates match tracking, rebuilding")
+		store = None
+	if store is None:
+		store = empty_store(feature_set)
+
+	keys = load_snapshot_matches(snapshot)[['match_id', 'date']] if snapshot is not None else load_match_keys(cursor)
+	team_stats = load_snapshot_team_stats(snapshot) if snapshot is not None else load_team_stats(cursor)
+	snapshots = snapshot_keys(team_stats)
+	ledger = store['ledger']
+
+	cutoffs = []
+	seen = set() if ledger is None else set(ledger['match_id'].astype(int))
+	unseen = keys[~keys['match_id'].astype(int).isin(seen)]
+	if len(unseen) > 0:
+		cutoffs.append(pd.Timestamp(unseen['date'].min()))
+	if ledger is not None and len(ledger) > 0:
+		cutoff = snapshot_cutoff(ledger, store['snapshots'], snapshots)
+		if cutoff is not None:
+			cutoffs.append(pd.Timestamp(cutoff))
+
+	if not cutoffs:
+		print(f"No new matches or team snapshots affecting rows since watermark {store['watermark']}")
+		return store['features'] if store['features'] is not None else empty_features(feature_set)
+
+	cutoff = min(cutoffs)
+	if store['watermark'] is not None and cutoff <= pd.Timestamp(store['watermark']):
+		prefix = ledger[(ledger['date'] < cutoff).to_numpy()].reset_index(drop=True)
+		print(f"New matches or team snapshots reach back to {cutoff}, refeaturizing {len(ledger) - len(prefix)} stored matches")
+		state = featurize_state(prefix, prefix['counted'].to_numpy()) if len(prefix) > 0 else None
+		features = store['features'][store['features']['match_id'].isin(prefix['match_id'])]
+		since = cutoff - pd.Timedelta(microseconds=1) if len(prefix) > 0 else None
+	else:
+		prefix, state, features, since = ledger, store['state'], store['features'], store['watermark']
+
+	if snapshot is not None:
+		new_matches = load_snapshot_matches(snapshot, since=since)
+	else:
+		new_matches = load_matches(cursor, since=since)
+	print(f"Featurizing {len(new_matches)} matches after {since}")
+
+	new_features, counted, state = featurize_matches(new_matches, team_stats, feature_set, state)
+	new_ledger = new_matches.assign(counted=counted)
+
+	if features is None or len(features) == 0:
+		features = new_features
+	else:
+		features = pd.concat([features, new_features], ignore_index=True)
+		features = features.drop_duplicates(subset='match_id', keep='last').reset_index(drop=True)
+
+	store['ledger'] = new_ledger if prefix is None or len(prefix) == 0 else pd.concat([prefix, new_ledger], ignore_index=True)
+	store['features'] = features
+	store['watermark'] = store['ledger']['date'].max()
+	store['state'] = state
+	store['snapshots'] = snapshots
+	store['stats_watermark'] = pd.to_datetime(team_stats['date']).max() if len(team_stats) > 0 else None
+	save_store(store, feature_set)
+
+	return features
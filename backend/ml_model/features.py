@@ -0,0 +1,285 @@
+import numpy as np
+import pandas as pd
+from team_form import TeamForm
+from team_stats_index import TeamStatsIndex, TEAM_STAT_COLUMNS
+
+LR_FEATURES = [
+	'tournament_type', 'best_of', 'ranking_diff', 'hth_wins_diff',
+	'rating_diff', 'KDA_diff', 'KAST_diff', 'ADR_diff'
+]
+
+NN_FEATURES = [
+	'tournament_type', 'best_of', 'ranking_diff', 'rating_diff', 'KDA_diff', 'KAST_diff', 'ADR_diff',
+	'round_wr_diff', 'opening_kill_rate_diff', 'multikill_rate_diff',
+	'5v4_wr_diff', '4v5_wr_diff', 'trade_rate_diff', 'utility_adr_diff',
+	'flash_assists_diff', 'pistol_wr_diff', 'round2_conv_diff',
+	'round2_break_diff', 'hth_wins_diff'
+]
+
+FEATURE_SETS = {
+	"lr": LR_FEATURES,
+	"nn": NN_FEATURES
+}
+
+# Columns of live_feature_frame that make up each model's input, in the model's feature order.
+# Live LR has always used the raw ranking difference as of today rather than the training-time log difference
+LIVE_FEATURE_SETS = {
+	"lr": ['live_ranking_diff' if col == 'ranking_diff' else col for col in LR_FEATURES],
+	"nn": NN_FEATURES
+}
+
+FORM_DIFFS = {
+	'team_rating': 'rating_diff',
+	'avg_kda': 'KDA_diff',
+	'avg_kast': 'KAST_diff',
+	'avg_adr': 'ADR_diff'
+}
+
+
+def load_matches(cursor, since=None):
+	query = """
+	SELECT
+		match_id,
+		date,
+		tournament_type,
+		best_of,
+		team_a,
+		team_b,
+		outcome,
+		team_a_rating,
+		team_a_kda,
+		team_a_kast,
+		team_a_adr,
+		team_b_rating,
+		team_b_kda,
+		team_b_kast,
+		team_b_adr
+	FROM matches
+	{}
+	ORDER BY date asc, match_id asc
+	""".format("WHERE date > %s" if since is not None else "")
+	cursor.execute(query, (since,) if since is not None else ())
+	columns = [col[0] for col in cursor.description]
+	df = pd.DataFrame(cursor.fetchall(), columns=columns)
+	df['date'] = pd.to_datetime(df['date'])
+
+	return df
+
+
+# match_id and date of every played match, to tell which ones a feature store has not seen yet
+def load_match_keys(cursor):
+	cursor.execute("SELECT match_id, date FROM matches")
+	df = pd.DataFrame(cursor.fetchall(), columns=['match_id', 'date'])
+	df['date'] = pd.to_datetime(df['date'])
+
+	return df
+
+
+# Upcoming matches by id, or dated within [since, until] (dates) when match_ids is None
+def load_upcoming_matches(cursor, match_ids=None, since=None, until=None):
+	if match_ids is not None:
+		if len(match_ids) == 0:
+			return pd.DataFrame(columns=['match_id', 'date', 'tournament_type', 'best_of', 'team_a', 'team_b'])
+		where = "WHERE match_id IN ({})".format(", ".join(["%s"] * len(match_ids)))
+		params = tuple(int(match_id) for match_id in match_ids)
+	else:
+		where = "WHERE DATE(date) >= %s AND DATE(date) <= %s"
+		params = (since, until)
+
+	query = f"""
+	SELECT
+		match_id,
+		date,
+		tournament_type,
+		best_of,
+		team_a,
+		team_b
+	FROM upcoming_matches
+	{where}
+	ORDER BY date asc, match_id asc
+	"""
+	cursor.execute(query, params)
+	columns = [col[0] for col in cursor.description]
+	return pd.DataFrame(cursor.fetchall(), columns=columns)
+
+
+def load_team_stats(cursor):
+	query = f"""
+	SELECT
+		team_name,
+		date,
+		{", ".join(TEAM_STAT_COLUMNS)}
+	FROM team_stats_by_date
+	"""
+	cursor.execute(query)
+	columns = [col[0] for col in cursor.description]
+	df = pd.DataFrame(cursor.fetchall(), columns=columns)
+	df['date'] = pd.to_datetime(df['date'])
+
+	return df
+
+
+def _numeric(df, columns):
+	for col in columns:
+		df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+	return df
+
+
+def log_ranking_diff(diff):
+	diff = np.asarray(diff, dtype=float)
+	return np.sign(diff) * np.log1p(np.abs(diff))
+
+
+# Head-to-head wins each team held over the other before the match, counting only rows in `counted`.
+# `record` maps (lo, hi) team pairs to wins carried over from earlier runs and is advanced in place
+def hth_wins_diff(matches, counted, record=None):
+	team_a = matches['team_a'].astype(str).to_numpy()
+	team_b = matches['team_b'].astype(str).to_numpy()
+	outcome = matches['outcome'].to_numpy()
+	counted = np.asarray(counted, dtype=bool)
+
+	lo = np.where(team_a < team_b, team_a, team_b)
+	hi = np.where(team_a < team_b, team_b, team_a)
+	a_won = counted & (outcome == 1)
+	b_won = counted & (outcome == 0)
+	lo_won = np.where(team_a == lo, a_won, b_won).astype(int)
+	hi_won = np.where(team_a == lo, b_won, a_won).astype(int)
+
+	wins = pd.DataFrame({'lo': lo, 'hi': hi, 'lo_won': lo_won, 'hi_won': hi_won})
+	before = wins.groupby(['lo', 'hi'], sort=False)[['lo_won', 'hi_won']].cumsum() - wins[['lo_won', 'hi_won']]
+
+	lo_before = before['lo_won'].to_numpy()
+	hi_before = before['hi_won'].to_numpy()
+
+	if record is not None:
+		carried = np.array([record.get(pair, (0, 0)) for pair in zip(lo, hi)], dtype=int).reshape(-1, 2)
+		lo_before = lo_before + carried[:, 0]
+		hi_before = hi_before + carried[:, 1]
+
+		totals = wins.groupby(['lo', 'hi'], sort=False)[['lo_won', 'hi_won']].sum()
+		for pair, (lo_total, hi_total) in zip(totals.index, totals.to_numpy()):
+			lo_prev, hi_prev = record.get(pair, (0, 0))
+			record[pair] = (lo_prev + int(lo_total), hi_prev + int(hi_total))
+
+	a_before = np.where(team_a == lo, lo_before, hi_before)
+	b_before = np.where(team_a == lo, hi_before, lo_before)
+
+	return a_before - b_before
+
+
+# Head-to-head win difference over each pair's last `limit` meetings in `matches` (ordered by date). Outcome 1 is a
+# team_a win and anything else, a missing outcome included, a team_b win. Pairs that never met get 0
+def recent_hth_wins_diff(matches, team_a, team_b, limit=10):
+	m_a = matches['team_a'].astype(str).to_numpy()
+	m_b = matches['team_b'].astype(str).to_numpy()
+	a_won = pd.to_numeric(matches['outcome'], errors='coerce').to_numpy() == 1
+
+	lo = np.where(m_a < m_b, m_a, m_b)
+	hi = np.where(m_a < m_b, m_b, m_a)
+	lo_won = np.where(m_a == lo, a_won, ~a_won).astype(int)
+
+	recent = pd.DataFrame({'lo': lo, 'hi': hi, 'lo_won': lo_won}).groupby(['lo', 'hi'], sort=False).tail(limit)
+	totals = recent.groupby(['lo', 'hi'])['lo_won'].agg(['sum', 'size'])
+	lo_diff = 2 * totals['sum'] - totals['size']
+
+	team_a = np.asarray(team_a).astype(str)
+	team_b = np.asarray(team_b).astype(str)
+	q_lo = np.where(team_a < team_b, team_a, team_b)
+	q_hi = np.where(team_a < team_b, team_b, team_a)
+	diff = lo_diff.reindex(pd.MultiIndex.from_arrays([q_lo, q_hi])).fillna(0).to_numpy()
+
+	return np.where(team_a == q_lo, diff, -diff).astype(int)
+
+
+# Returns the feature frame plus the running state (head-to-head record and form tail) needed to
+# featurize later matches without reloading earlier ones. Pass that state back in to continue
+def featurize(matches, team_stats, feature_set, state=None):
+	df, _, state = featurize_matches(matches, team_stats, feature_set, state)
+	return df, state
+
+
+# featurize, plus which rows of `matches` advanced the head-to-head record (see featurize_state)
+def featurize_matches(matches, team_stats, feature_set, state=None):
+	features = FEATURE_SETS[feature_set]
+	state = dict(state) if state is not None else {'hth': {}, 'form_tail': None}
+	matches = matches.reset_index(drop=True)
+	df = matches[['match_id', 'date', 'tournament_type', 'best_of', 'team_a', 'team_b', 'outcome']].copy()
+	df = _numeric(df, ['tournament_type', 'best_of', 'outcome'])
+
+	index = TeamStatsIndex(team_stats)
+	a_stats = index.lookup_many(matches['team_a'], matches['date'])
+	b_stats = index.lookup_many(matches['team_b'], matches['date'])
+
+	df['ranking_diff'] = log_ranking_diff(a_stats['ranking'] - b_stats['ranking'])
+	for col in TEAM_STAT_COLUMNS[1:]:
+		df[f'{col}_diff'] = a_stats[col] - b_stats[col]
+
+	team_form = TeamForm(matches, history=state['form_tail'])
+	form = team_form.for_matches()
+	for col, diff_col in FORM_DIFFS.items():
+		df[diff_col] = form['a'][col] - form['b'][col]
+
+	# The legacy loops only advanced the head-to-head record for rows they kept
+	diff_columns = [col for col in features if col not in ('tournament_type', 'best_of', 'hth_wins_diff')]
+	if feature_set == "lr":
+		counted = df[diff_columns + ['tournament_type', 'best_of', 'outcome']].notna().all(axis=1)
+	else:
+		counted = df[diff_columns].notna().all(axis=1)
+
+	hth = dict(state['hth'])
+	df['hth_wins_diff'] = hth_wins_diff(df, counted, hth)
+
+	df = df[counted.to_numpy()]
+	df = df[['match_id', 'date', 'team_a', 'team_b', 'outcome'] + features].dropna()
+
+	state = {'hth': hth, 'form_tail': team_form.tail()}
+
+	return df.reset_index(drop=True), counted.to_numpy(), state
+
+
+# The state featurize holds after `matches` (date ordered), rebuilt from the matches and their counted flags
+def featurize_state(matches, counted):
+	hth = {}
+	outcome = _numeric(matches[['team_a', 'team_b', 'outcome']].copy(), ['outcome'])
+	hth_wins_diff(outcome, counted, hth)
+	return {'hth': hth, 'form_tail': TeamForm(matches).tail()}
+
+
+def build_features(matches, team_stats, feature_set):
+	df, _ = featurize(matches, team_stats, feature_set)
+	return df
+
+
+# Every live feature any model uses, computed once for a frame of upcoming matches (see LIVE_FEATURE_SETS).
+# Values a team has no history for are NaN; `form.matches` supplies the head-to-head history
+def live_feature_frame(upcoming, form, stats_index, today):
+	upcoming = upcoming.reset_index(drop=True)
+	df = upcoming[['match_id']].copy()
+	df['tournament_type'] = pd.to_numeric(upcoming['tournament_type']).astype(float)
+	df['best_of'] = pd.to_numeric(upcoming['best_of']).astype(float)
+
+	a_today = stats_index.lookup_many(upcoming['team_a'], [today] * len(upcoming))
+	b_today = stats_index.lookup_many(upcoming['team_b'], [today] * len(upcoming))
+	df['live_ranking_diff'] = np.nan_to_num((a_today['ranking'] - b_today['ranking']).to_numpy()).astype(int)
+
+	a_stats = stats_index.lookup_many(upcoming['team_a'], upcoming['date'])
+	b_stats = stats_index.lookup_many(upcoming['team_b'], upcoming['date'])
+	df['ranking_diff'] = log_ranking_diff(a_stats['ranking'] - b_stats['ranking'])
+	for col in TEAM_STAT_COLUMNS[1:]:
+		df[f'{col}_diff'] = a_stats[col] - b_stats[col]
+
+	a_form = form.as_of_many(upcoming['team_a'], upcoming['date'])
+	b_form = form.as_of_many(upcoming['team_b'], upcoming['date'])
+	for col, diff_col in FORM_DIFFS.items():
+		df[diff_col] = a_form[col] - b_form[col]
+
+	df['hth_wins_diff'] = recent_hth_wins_diff(form.matches, upcoming['team_a'], upcoming['team_b'])
+
+	return df
+
+
+# (match_ids, feature matrix) of the rows in a live_feature_frame that have every feature `feature_set` needs
+def live_features(frame, feature_set):
+	X = frame[LIVE_FEATURE_SETS[feature_set]].to_numpy(dtype=float)
+	keep = ~np.isnan(X).any(axis=1)
+	return frame['match_id'][keep].tolist(), X[keep]
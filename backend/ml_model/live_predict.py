@@ -0,0 +1,149 @@
+import os
+import sys
+import numpy as np
+from datetime import datetime, timedelta
+from ml_util import db_connect, db_write_live_prediction_sets, plot_graphs, create_rolling_feature_metrics, create_matches_insertion_graph, create_correlation_matrix
+from features import load_matches, load_team_stats, load_upcoming_matches, live_feature_frame, live_features
+from team_form import TeamForm
+from team_stats_index import TeamStatsIndex
+from model_registry import load_registered_model, predict_proba
+from prediction_cache import PredictionCache
+
+# Models the live pipeline scores: registry name (also its feature set) -> where its predictions are stored.
+# A new model needs an entry here and in features.LIVE_FEATURE_SETS
+LIVE_MODELS = {
+	"lr": {"model_id": 1, "model_name": "logistic_regression"},
+	"nn": {"model_id": 2, "model_name": "neural_network"}
+}
+
+# Days back from today covered by a prediction window
+WINDOW_DAYS = 2
+
+# "int8" scores the MLP with its dynamically quantized registry copy (model_registry.quantize_model), falling back
+# to the float model when there is none, it predates the newest float version, or torch can't run it.
+# Pinned versions are used as given
+NN_INFERENCE = os.getenv("NN_INFERENCE", "float")
+
+
+# key -> {"model", "scaler", "version", "fused"} for the newest compatible registry version of each model, or a pinned one
+def load_live_models(keys=None, versions=None):
+	versions = versions or {}
+	models = {}
+	for key in keys or list(LIVE_MODELS):
+		manifest = None
+		if key == "nn" and NN_INFERENCE == "int8" and versions.get(key) is None:
+			try:
+				model, scaler, manifest = load_registered_model(key, key, quantized=True)
+			except (OSError, ImportError, RuntimeError) as e:
+				print(f"{e}; using the float model")
+		if manifest is None:
+			model, scaler, manifest = load_registered_model(key, key, versions.get(key))
+		models[key] = {"model": model, "scaler": scaler, "version": manifest['version'], "fused": manifest.get('fused', False)}
+	return models
+
+
+def load_live_indexes(cursor):
+	return TeamForm(load_matches(cursor)), TeamStatsIndex(load_team_stats(cursor))
+
+
+def load_window(cursor, today, days=WINDOW_DAYS):
+	return load_upcoming_matches(cursor, since=today - timedelta(days=days), until=today)
+
+
+# Scores each model on its columns of the shared live feature frame: one transform and one predict call per model.
+# With caches (key -> PredictionCache) only matches that are new or whose features or model version changed are scored
+def score_live_models(frame, models, caches=None):
+	scored = {}
+	for key, slot in models.items():
+		match_ids, X = live_features(frame, key)
+		hashes = None
+		if caches is not None:
+			pending, hashes = caches[key].pending(match_ids, slot['version'], X)
+			print(f"{key}: {int(pending.sum())} of {len(match_ids)} upcoming matches need predictions")
+			match_ids, X, hashes = np.asarray(match_ids)[pending].tolist(), X[pending], np.asarray(hashes)[pending].tolist()
+
+		# A fused model scores the raw rows; the scaled ones are still what live_feature_vectors stores
+		X_scaled = slot['scaler'].transform(X) if len(match_ids) > 0 else X
+		probs = predict_proba(slot['model'], X if slot['fused'] else X_scaled) if len(match_ids) > 0 else np.empty(0)
+		predictions = (probs >= 0.5).astype(int)
+		scored[key] = {
+			'match_ids': match_ids,
+			'X_scaled': X_scaled,
+			'probs': probs,
+			'predictions': predictions,
+			'confidences': np.where(predictions == 1, probs, 1 - probs),
+			'hashes': hashes
+		}
+	return scored
+
+
+# Every model's predictions and feature vectors in one transaction; caches advance only once it commits
+def write_live_models(db, scored, models, caches=None):
+	prediction_sets = [
+		(LIVE_MODELS[key]['model_id'], s['match_ids'], s['X_scaled'], s['predictions'], s['confidences'])
+		for key, s in scored.items()
+	]
+	written = db_write_live_prediction_sets(db, prediction_sets)
+
+	if written and caches is not None:
+		for key, s in scored.items():
+			if len(s['match_ids']) > 0:
+				caches[key].update(s['match_ids'], models[key]['version'], s['hashes'])
+	return written
+
+
+def live_reports(db, key):
+	model_id, model_name = LIVE_MODELS[key]['model_id'], LIVE_MODELS[key]['model_name']
+	plot_graphs(db.cursor(), model_id, model_name, "Live")
+	create_rolling_feature_metrics(model_name, model_id, "Live", db)
+	if key == "lr":
+		create_matches_insertion_graph(db)
+	create_correlation_matrix(model_name, model_id, db)
+
+
+# One prediction pass over the window for every model in `keys`: the window, team indexes and features are
+# loaded and computed once and shared by all models
+def run_live_predictions(keys=None, reports=True):
+	models = {}
+	for key in keys or list(LIVE_MODELS):
+		try:
+			models.update(load_live_models([key]))
+			print(f"Using {LIVE_MODELS[key]['model_name']} v{models[key]['version']}")
+		except (OSError, ValueError) as e:
+			print(f"Error opening {key} model:", e)
+	if not models:
+		return
+
+	today = datetime.now().date()
+
+	# One pooled connection serves every stage of the run
+	db = db_connect()
+	cursor = db.cursor()
+	try:
+		window = load_window(cursor, today)
+		form, stats_index = load_live_indexes(cursor)
+	finally:
+		cursor.close()
+
+	# A failed write raises, so the script exits non-zero and the next run retries the same matches
+	try:
+		frame = live_feature_frame(window, form, stats_index, today)
+		caches = {key: PredictionCache(key) for key in models}
+		scored = score_live_models(frame, models, caches)
+		if not write_live_models(db, scored, models, caches):
+			raise RuntimeError("Writing live predictions failed, nothing was saved")
+
+		if reports:
+			for key in models:
+				live_reports(db, key)
+	finally:
+		db.close()
+
+
+# python live_predict.py [lr] [nn]: scores the given models (default: all) in one pass
+def main():
+	run_live_predictions(sys.argv[1:] or None)
+
+
+if __name__ == "__main__":
+	main()
@@ -1,18 +1,104 @@
 import joblib
 import json
+import copy
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split, GridSearchCV
-from sklearn.metrics import confusion_matrix, log_loss, roc_auc_score
-from ml_util import insert_model_metrics, getDateStamp, save_object, db_insert_feature_vector, db_connect, create_class_seperation_quality_plot, create_class_representation_bar_graph, create_cumm_accuracy_graph, create_rolling_accuracy_graph
+from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold
+from sklearn.metrics import confusion_matrix, log_loss, roc_auc_score, f1_score
+from joblib import Parallel, delayed
+from features import LR_FEATURES
+from feature_store import store_watermark
+from walk_forward import walk_forward_windows
+from model_registry import register_model
+from ml_util import insert_model_metrics, getDateStamp, save_object, save_model_meta, save_model_scaler, latest_model, load_feature_frame, db_replace_training_feature_vectors, db_connect, create_class_seperation_quality_plot, create_class_representation_bar_graph, create_cumm_accuracy_graph, create_rolling_accuracy_graph
 
-def lr_train_model(match_feature_lists):
+LR_MODEL_DIR = Path(__file__).resolve().parent / "lr_model_data"
+
+LR_PARAM_GRID = {
+	'penalty': ['l1', 'l2'], 
+	'C': [0.1, 1, 10, 20, 50],
+	'max_iter': [500, 1000, 1500, 2500]
+}
+
+# C values walked in increasing order (strongest regularization first) by the path search.
+# Solvers are the ones that warm-start from coef_ for each penalty (liblinear always starts cold)
+LR_PATH_CS = np.logspace(-2, 2, 13)
+LR_PATH_SOLVERS = {'l1': 'saga', 'l2': 'lbfgs'}
+
+
+def lr_grid_search(X, y, cv=5):
+	grid_search = GridSearchCV(LogisticRegression(solver='liblinear'), LR_PARAM_GRID, cv=cv, scoring='f1', n_jobs=-1)
+	grid_search.fit(X, y)
+	return grid_search.best_estimator_
+
+
+# F1 on one validation fold for every C. One model is refit along the path, warm-started from the previous C's coefficients
+def lr_fold_path(X, y, train_index, val_index, penalty, Cs, max_iter):
+	model = LogisticRegression(penalty=penalty, solver=LR_PATH_SOLVERS[penalty], warm_start=True, max_iter=max_iter)
+	scores = []
+
+	for C in Cs:
+		model.set_params(C=C)
+		model.fit(X[train_index], y[train_index])
+		scores.append(f1_score(y[val_index], model.predict(X[val_index])))
+
+	return scores
+
+
+# Walk-forward path for one penalty: F1 per (window, C). The first window walks the C path like lr_fold_path, keeping a
+# copy of the model at every C; each later window then refits every C's model warm-started from its previous window
+def lr_walk_forward_path(X, y, windows, penalty, Cs, max_iter):
+	models = []
+	scores = []
+
+	for window_idx, (train_index, val_index) in enumerate(windows):
+		window_scores = []
+		for C_idx, C in enumerate(Cs):
+			if window_idx == 0:
+				base = copy.deepcopy(models[-1]) if models else LogisticRegression(penalty=penalty, solver=LR_PATH_SOLVERS[penalty], warm_start=True, max_iter=max_iter)
+				models.append(base.set_params(C=C))
+
+			model = models[C_idx]
+			model.fit(X[train_index], y[train_index])
+			window_scores.append(f1_score(y[val_index], model.predict(X[val_index])))
+		scores.append(window_scores)
+
+	return scores
+
+
+# Warm-started regularization path per (penalty, fold), then a single refit of the best (penalty, C) by mean F1.
+# With `windows` (walk_forward.walk_forward_windows) the folds are time-ordered windows walked by lr_walk_forward_path
+def lr_path_search(X, y, Cs=LR_PATH_CS, penalties=('l1', 'l2'), cv=5, max_iter=2500, windows=None):
+	if windows is not None:
+		path_scores = Parallel(n_jobs=-1)(delayed(lr_walk_forward_path)(X, y, windows, penalty, Cs, max_iter) for penalty in penalties)
+	else:
+		folds = list(StratifiedKFold(n_splits=cv).split(X, y))
+		tasks = [(penalty, train_index, val_index) for penalty in penalties for train_index, val_index in folds]
+
+		fold_scores = Parallel(n_jobs=-1)(
+			delayed(lr_fold_path)(X, y, train_index, val_index, penalty, Cs, max_iter) for penalty, train_index, val_index in tasks
+		)
+		path_scores = [fold_scores[p_idx * cv:(p_idx + 1) * cv] for p_idx in range(len(penalties))]
+
+	best_score, best_penalty, best_C = -np.inf, None, None
+	for penalty, scores in zip(penalties, path_scores):
+		mean_scores = np.mean(scores, axis=0)
+		print(f"{penalty} path: best F1 {mean_scores.max():.4f} at C={Cs[mean_scores.argmax()]:.4g}")
+		if mean_scores.max() > best_score:
+			best_score, best_penalty, best_C = mean_scores.max(), penalty, float(Cs[mean_scores.argmax()])
+
+	model = LogisticRegression(penalty=best_penalty, C=best_C, solver=LR_PATH_SOLVERS[best_penalty], max_iter=max_iter)
+	return model.fit(X, y)
+
+
+# tuning "path" walks a warm-started regularization path; "grid" is the original GridSearchCV over penalty, C and max_iter.
+# cv "walk_forward" holds out the latest matches as test data and tunes on time-ordered windows (rows are in date order),
+# each trained on every earlier match (window_mode "expanding") or only the most recent block ("sliding")
+def lr_train_model(match_feature_lists, write_db=True, tuning="path", cv="kfold", window_mode="expanding"):
 	model_id = 1
-	db = db_connect()
-	cursor = db.cursor()
 
 	print("Beginning model training...")
 	matches = np.array(match_feature_lists, dtype=object)
@@ -23,7 +109,12 @@ def lr_train_model(match_feature_lists):
 	scaler = StandardScaler()
 	X_scaled = scaler.fit_transform(X)
 
-	X_trainval, X_test, y_trainval, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=7)
+	if cv == "walk_forward":
+		X_trainval, X_test, y_trainval, y_test = train_test_split(X_scaled, y, test_size=0.2, shuffle=False)
+		windows = walk_forward_windows(len(X_trainval), mode=window_mode)
+	else:
+		X_trainval, X_test, y_trainval, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=7)
+		windows = None
 	
 	test_data_path = Path(__file__).resolve().parent / f"lr_model_data/test_data_{getDateStamp()}.npz"
 	np.savez(test_data_path, X_test=X_test, y_test=y_test)
@@ -31,42 +122,31 @@ def lr_train_model(match_feature_lists):
 	scaler_path = Path(__file__).resolve().parent / "lr_model_data/standard_lr_scaler.pkl"
 	save_object(scaler, scaler_path)
 
-	# Grid search
-	param_grid = {
-		'penalty': ['l1', 'l2'], 
-		'C': [0.1, 1, 10, 20, 50],
-		'max_iter': [500, 1000, 1500, 2500]
-	}
-
-	model = LogisticRegression(solver='liblinear')
-	grid_search = GridSearchCV(model, param_grid, cv=5, scoring='f1', n_jobs=-1)
-	grid_search.fit(X_trainval, y_trainval)
+	if tuning == "grid":
+		best_estimator = lr_grid_search(X_trainval, y_trainval, cv=windows if windows is not None else 5)
+	else:
+		best_estimator = lr_path_search(X_trainval, y_trainval, windows=windows)
 
 	lr_classifier_path = Path(__file__).resolve().parent / f"lr_model_data/lr_classifier_{getDateStamp()}.pkl"
-	print(grid_search.best_estimator_)
+	print(best_estimator)
 
-	save_object(grid_search.best_estimator_, lr_classifier_path)
+	save_object(best_estimator, lr_classifier_path)
 
-	try:
-		for match, features in zip(match_feature_lists, X_scaled):
-			db_insert_feature_vector(cursor, match[-1], "training", features, model_id)
-			db.commit()
-	except Exception as e:
-		print("Error inserting training feature vector:", e)
-		db.rollback()
-	finally:
-		db.commit()
-		db.close()
+	if not write_db:
+		print("Finished model training")
+		return
+
+	db = db_connect()
+	match_ids = [match[-1] for match in match_feature_lists]
+	db_replace_training_feature_vectors(db, match_ids, X_scaled, model_id)
+	db.close()
 
 	print("Finished model training")
 	
 
-def evaluate_model(model, test_data, model_name):
+def evaluate_model(model, test_data, model_name, write_db=True):
 	print("Starting model evalutation")
 
-	db = db_connect()
-	cursor = db.cursor()
-
 	model = joblib.load(model)
 	data = np.load(test_data)
 	stage = "Training"
@@ -86,12 +166,18 @@ def evaluate_model(model, test_data, model_name):
 		"confusion_matrix": cm,
 	}
 
-	try:
-		insert_model_metrics(cursor, "logistic_regression", results)
-		db.commit()
-	except Exception as e:
-		print("Error inserting model metrics:", e)
-		db.rollback()
+	if write_db:
+		db = db_connect()
+		cursor = db.cursor()
+
+		try:
+			insert_model_metrics(cursor, "logistic_regression", results)
+			db.commit()
+		except Exception as e:
+			print("Error inserting model metrics:", e)
+			db.rollback()
+		finally:
+			db.close()
 	
 	create_class_seperation_quality_plot(y_test, y_prob, model_name, stage)
 	create_class_representation_bar_graph(y_pred, model_name, stage)
@@ -128,4 +214,46 @@ def lr_train_final_model(model, matches):
     print(feature_weights)
 
     final_model_path = Path(__file__).resolve().parent / f"lr_model_data/lr_final_classifier_{getDateStamp()}.pkl"
-    save_object(model, final_model_path)
\ No newline at end of file
+    meta = {'mode': 'full', 'watermark': store_watermark("lr"), 'scaler': save_model_scaler(scaler, final_model_path)}
+    save_object(model, final_model_path)
+    save_model_meta(final_model_path, meta)
+    register_model("lr", "logistic_regression", model, scaler, "lr", dict(meta, source_model=final_model_path.name))
+
+
+# Update mode: once matches newer than the latest final model's watermark exist, refit it on every stored match,
+# warm-started from its current coefficients, and save it as a new version. The base model's own scaler is kept as is
+def lr_update_model(snapshot=None):
+	model_path, meta = latest_model(LR_MODEL_DIR, "lr_final_classifier_*.pkl")
+	if model_path is None:
+		print("No trained logistic regression model with metadata found, run a full training first")
+		return None
+
+	df = load_feature_frame("lr", snapshot)
+	watermark = pd.Timestamp(meta['watermark'])
+	new_matches = int((df['date'] > watermark).sum())
+	if new_matches == 0:
+		print(f"No matches after {watermark}, {model_path.name} is up to date")
+		return model_path
+
+	print(f"Updating {model_path.name} with {new_matches} matches after {watermark}")
+	model = joblib.load(model_path)
+	scaler = joblib.load(model_path.parent / meta['scaler'])
+
+	X = scaler.transform(df[LR_FEATURES].astype(float).values)
+	y = df['outcome'].astype(int).values
+
+	# liblinear (models tuned with --tuning grid) ignores warm_start, so those continue with the path solver for their penalty
+	if model.solver not in LR_PATH_SOLVERS.values():
+		print(f"{model_path.name} uses the {model.solver} solver, which can't warm start; refitting with {LR_PATH_SOLVERS[model.penalty]} from its coefficients")
+		model.set_params(solver=LR_PATH_SOLVERS[model.penalty])
+	model.set_params(warm_start=True)
+	model.fit(X, y)
+
+	updated_path = LR_MODEL_DIR / f"lr_final_classifier_{getDateStamp()}_update.pkl"
+	meta = {'mode': 'update', 'watermark': store_watermark("lr"), 'scaler': save_model_scaler(scaler, updated_path), 'base_model': model_path.name}
+	save_object(model, updated_path)
+	save_model_meta(updated_path, meta)
+	register_model("lr", "logistic_regression", model, scaler, "lr", dict(meta, source_model=updated_path.name))
+	print(f"Saved {updated_path.name}")
+
+	return updated_path
\ No newline at end of file
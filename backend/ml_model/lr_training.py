@@ -1,12 +1,32 @@
+import argparse
 from ml_util import process_matches, getDateStamp
-from lr_model import lr_train_model, evaluate_model, lr_train_final_model
+from lr_model import lr_train_model, evaluate_model, lr_train_final_model, lr_update_model
+from model_registry import fuse_model
 
 
 def main():
-    match_feature_lists = process_matches()
-    lr_train_model(match_feature_lists)
-    evaluate_model(f'lr_model_data/lr_classifier_{getDateStamp()}.pkl', f'lr_model_data/test_data_{getDateStamp()}.npz', model_name="logistic_regression")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--snapshot", help="Train from a snapshot directory written by snapshot.py instead of MySQL")
+    parser.add_argument("--tuning", choices=["path", "grid"], default="path", help="Warm-started regularization path or the full GridSearchCV")
+    parser.add_argument("--update", action="store_true", help="Warm-start the latest final model on matches since its watermark instead of a full retrain")
+    parser.add_argument("--cv", choices=["kfold", "walk_forward"], default="kfold", help="Random split and stratified folds, or a time-ordered holdout and walk-forward windows")
+    parser.add_argument("--window", choices=["expanding", "sliding"], default="expanding", help="Walk-forward training window")
+    parser.add_argument("--fuse", action="store_true", help="Also register the final model with the scaler folded into its coefficients")
+    args = parser.parse_args()
+    write_db = args.snapshot is None
+
+    if args.update:
+        lr_update_model(snapshot=args.snapshot)
+        if args.fuse:
+            fuse_model("lr")
+        return
+
+    match_feature_lists = process_matches(snapshot=args.snapshot)
+    lr_train_model(match_feature_lists, write_db=write_db, tuning=args.tuning, cv=args.cv, window_mode=args.window)
+    evaluate_model(f'lr_model_data/lr_classifier_{getDateStamp()}.pkl', f'lr_model_data/test_data_{getDateStamp()}.npz', model_name="logistic_regression", write_db=write_db)
     lr_train_final_model(f'lr_model_data/lr_classifier_{getDateStamp()}.pkl', match_feature_lists)
+    if args.fuse:
+        fuse_model("lr")
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
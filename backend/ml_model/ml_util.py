@@ -1,34 +1,83 @@
 import mysql.connector
+from mysql.connector import pooling
 import pandas as pd
 import os
 import datetime
+import time
 import joblib
-import math
+import json
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib.patches import Patch
 from dotenv import load_dotenv
 from pathlib import Path
-from collections import defaultdict
+from contextlib import contextmanager
 from sklearn.preprocessing import StandardScaler
+from features import LR_FEATURES, NN_FEATURES
+from feature_store import update_feature_store
+
+_pool = None
+
+
+def _db_config():
+	env_path = Path(__file__).resolve().parent.parent / '.env'
+	load_dotenv(env_path)
+
+	return {
+		"host": os.getenv("DB_HOST"),
+		"user": os.getenv("DB_USER"),
+		"password": os.getenv("DB_PASSWORD"),
+		"database": os.getenv("DB_NAME")
+	}
+
+
+# One pool per process; the .env file is read once when it is created. `size` overrides DB_POOL_SIZE for
+# processes that know their own concurrency, and only applies to the call that creates the pool
+def get_pool(size=None):
+	global _pool
+	if _pool is None:
+		# _db_config loads .env, so it has to run before DB_POOL_SIZE is read
+		config = _db_config()
+		_pool = pooling.MySQLConnectionPool(
+			pool_name="ml_model",
+			pool_size=size or int(os.getenv("DB_POOL_SIZE", 2)),
+			**config
+		)
+	return _pool
+
 
+# Connections are borrowed from the pool; close() hands them back warm instead of disconnecting.
+# When every connection is out, waits up to DB_POOL_TIMEOUT seconds for one to come back. Errors are raised
 def db_connect():
-	try:
-		env_path = Path(__file__).resolve().parent.parent / '.env'
-		load_dotenv(env_path)
-
-		db = mysql.connector.connect(
-			host=os.getenv("DB_HOST"),
-			user=os.getenv("DB_USER"),
-			password=os.getenv("DB_PASSWORD"),
-			database=os.getenv("DB_NAME")
-		)
-	
-		return db
+	deadline = time.monotonic() + float(os.getenv("DB_POOL_TIMEOUT", 30))
+	while True:
+		try:
+			return get_pool().get_connection()
 
-	except mysql.connector.Error as e:
-		print("Database connection error:", e)
-		return None
+		except mysql.connector.errors.PoolError:
+			if time.monotonic() >= deadline:
+				raise
+			time.sleep(0.05)
+
+		except mysql.connector.Error as e:
+			print("Database connection error:", e)
+			raise
+
+
+# Cursor on `db`, or on a connection borrowed for the duration of the block when db is None
+@contextmanager
+def db_cursor(db=None, dictionary=False):
+	owned = db is None
+	if owned:
+		db = db_connect()
+
+	cursor = db.cursor(dictionary=dictionary)
+	try:
+		yield cursor
+	finally:
+		cursor.close()
+		if owned:
+			db.close()
 
 
 def save_object(obj, path):
@@ -43,340 +92,183 @@ def getDateStamp():
 	return date_string
 
 
-# Used in live match prediction to get all hth lineups
-def get_hth_wins(cursor, team_a, team_b):
-	query = """
-    SELECT team, COUNT(*) AS wins
-			FROM (
-				SELECT
-					CASE
-							WHEN outcome = 1 THEN team_a
-							ELSE team_b
-					END AS team
-				FROM (
-					SELECT team_a, team_b, outcome
-					FROM matches
-					WHERE (team_a = %s AND team_b = %s) OR (team_a = %s AND team_b = %s)
-					ORDER BY date DESC
-					LIMIT 10
-				) AS recent_matches
-			) AS hth
-		GROUP BY team;
-  """
-	cursor.execute(query, (team_a, team_b, team_b, team_a))
-	results = cursor.fetchall()
-
-	# Initialize wins dict
-	wins = {team_a: 0, team_b: 0}
-
-	for row in results:
-			team, count = row
-			wins[team] = count
-
-
-	return (wins[team_a], wins[team_b])
-
-
-def get_team_ranking(cursor, team_name, date):
-	query = """
-	SELECT ranking 
-		FROM team_stats_by_date
-		WHERE team_name = %s
-	ORDER BY ABS(TIMESTAMPDIFF(SECOND, date, %s))
-	LIMIT 1
-	"""
+# Training metadata (watermark, scaler, hyperparameters, ...) saved next to a model as <model>.json
+def model_meta_path(model_path):
+	return Path(model_path).with_suffix(".json")
 
-	cursor.execute(query, (team_name, date))
-	result = cursor.fetchone()
 
-	return result[0] if result else None
+# Every final model keeps its own copy of the scaler it was fit with, since the shared standard_*_scaler.pkl is
+# rewritten at the start of each training run. Returns the file name its metadata should point at
+def save_model_scaler(scaler, model_path):
+	model_path = Path(model_path)
+	scaler_path = model_path.with_name(model_path.name.replace("_classifier_", "_scaler_"))
+	save_object(scaler, scaler_path)
+	return scaler_path.name
 
 
-def get_team_stats_by_date(cursor, team_name, date):
-	query = """
-	SELECT 
-		ranking, 
-		round_wr, 
-		opening_kill_rate, 
-		multikill_rate, 
-		5v4_wr, 
-		4v5_wr, 
-		trade_rate, 
-		utility_adr, 
-		flash_assists, 
-		pistol_wr, 
-		round2_conv, 
-		round2_break
-	FROM team_stats_by_date
-		WHERE team_name = %s
-	ORDER BY ABS(TIMESTAMPDIFF(SECOND, date, %s))
-    LIMIT 1
-	"""
-	cursor.execute(query, (team_name, date))
-	result = cursor.fetchone()
+def save_model_meta(model_path, meta):
+	meta = dict(meta, model=Path(model_path).name, trained_at=datetime.datetime.now().isoformat())
+	with open(model_meta_path(model_path), "w") as f:
+		json.dump(meta, f, indent=4, default=str)
 
-	return result
 
+def load_model_meta(model_path):
+	path = model_meta_path(model_path)
+	if not path.exists():
+		return None
+	with open(path) as f:
+		return json.load(f)
 
-def get_past_stats(cursor, team_name, match_date):
-	query = """
-		SELECT 
-			AVG(team_rating) AS team_rating,
-			AVG(avg_kda) AS avg_kda,
-			AVG(avg_kast) AS avg_kast,
-			AVG(avg_adr) AS avg_adr
-		FROM (
-			SELECT * FROM (
-				SELECT 
-					match_id, 
-					team_a_rating AS team_rating, 
-					team_a_kda AS avg_kda, 
-					team_a_kast AS avg_kast, 
-					team_a_adr AS avg_adr,
-					date
-				FROM matches
-				WHERE team_a = %s AND match_id < %s
 
-				UNION ALL
+# Most recently trained model in `directory` matching `pattern` that has metadata, as (path, meta)
+def latest_model(directory, pattern):
+	candidates = []
+	for path in Path(directory).glob(pattern):
+		meta = load_model_meta(path)
+		if meta is not None:
+			candidates.append((meta['trained_at'], path, meta))
 
-				SELECT 
-					match_id, 
-					team_b_rating AS team_rating, 
-					team_b_kda AS avg_kda, 
-					team_b_kast AS avg_kast, 
-					team_b_adr AS avg_adr,
-					date
-				FROM matches
-				WHERE team_b = %s AND match_id < %s
-			) AS team_matches
-			ORDER BY date DESC
-			LIMIT 10
-		) AS last_10_matches;
-	"""
+	if not candidates:
+		return None, None
 
-	cursor.execute(query, (team_name, match_date, team_name, match_date))
-	past_stats = cursor.fetchone()
-	
-	return past_stats
-	
+	trained_at, path, meta = max(candidates)
+	return path, meta
+
+
+FEATURE_VECTOR_COLUMNS = [
+	"match_id", "model_id", "tournament_type", "best_of", "ranking_diff", "hth_wins_diff",
+	"rating_diff", "KDA_diff", "KAST_diff", "ADR_diff", "round_wr_diff", "opening_kill_rate_diff",
+	"multikill_rate_diff", "5v4_wr_diff", "4v5_wr_diff", "trade_rate_diff", "utility_adr_diff",
+	"flash_assists_diff", "pistol_wr_diff", "round2_conv_diff", "round2_break_diff"
+]
 
-def db_insert_feature_vector(cursor, match_id, source, match, model_id):
-	columns = [
-		"match_id", "model_id", "tournament_type", "best_of", "ranking_diff", "hth_wins_diff",
-		"rating_diff", "KDA_diff", "KAST_diff", "ADR_diff", "round_wr_diff", "opening_kill_rate_diff",
-		"multikill_rate_diff", "5v4_wr_diff", "4v5_wr_diff", "trade_rate_diff", "utility_adr_diff",
-		"flash_assists_diff", "pistol_wr_diff", "round2_conv_diff", "round2_break_diff"
-	]
 
+def _feature_vector_query(source):
 	table_name = "feature_vectors" if source == "training" else "live_feature_vectors"
-	placeholders = ", ".join(["%s"] * len(columns))
-	column_list = ", ".join(columns)
-	query = f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
-	values = (match_id, model_id) + tuple(match)
-	padded_values = values + (None,) * (len(columns) - len(values))
+	placeholders = ", ".join(["%s"] * len(FEATURE_VECTOR_COLUMNS))
+	column_list = ", ".join(FEATURE_VECTOR_COLUMNS)
+	return f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
 
-	cursor.execute(query, padded_values)
 
+def _feature_vector_row(match_id, match, model_id):
+	values = (int(match_id), model_id) + tuple(None if v is None else float(v) for v in match)
+	return values + (None,) * (len(FEATURE_VECTOR_COLUMNS) - len(values))
 
-def insert_model_metrics(cursor, model_name, metrics):
-	date = datetime.date.today()
 
-	query = """
-	INSERT INTO
-		model
-		(model_name, date, t_neg, f_neg, t_pos, f_pos, loss, roc_auc)
-	VALUES
-		(%s, %s, %s, %s, %s, %s, %s, %s)
-	"""
+# executemany on a plain INSERT ... VALUES is sent as one multi-row INSERT per chunk
+def db_insert_feature_vectors(cursor, match_ids, X, source, model_id, chunk_size=1000):
+	query = _feature_vector_query(source)
+	rows = [_feature_vector_row(match_id, match, model_id) for match_id, match in zip(match_ids, np.asarray(X).tolist())]
 
-	cursor.execute(query, (model_name, date, metrics['confusion_matrix'][0][0], metrics['confusion_matrix'][1][0], metrics['confusion_matrix'][1][1], metrics['confusion_matrix'][0][1], metrics['loss'], metrics['ROC AUC']))
+	for start in range(0, len(rows), chunk_size):
+		cursor.executemany(query, rows[start:start + chunk_size])
 
 
-def process_matches():
-	print("Beginning to process matches...")
-	db = db_connect()
+# Swaps a model's training vectors for the new set in a single transaction, so readers never see a partial set
+def db_replace_training_feature_vectors(db, match_ids, X, model_id, chunk_size=1000):
 	cursor = db.cursor()
 
+	try:
+		cursor.execute("DELETE FROM feature_vectors WHERE model_id = %s", (model_id,))
+		db_insert_feature_vectors(cursor, match_ids, X, "training", model_id, chunk_size)
+		db.commit()
+	except Exception as e:
+		print("Error inserting training feature vectors:", e)
+		db.rollback()
+	finally:
+		cursor.close()
+
+
+def db_insert_predictions(cursor, match_ids, predictions, confidences, model_id):
 	query = """
-	SELECT 
-		match_id, 
-		date, 
-		tournament_type, 
-		best_of, 
-		team_a,
-		team_b,
-		outcome 
-	FROM matches
-	ORDER BY date asc
+		INSERT INTO match_predictions (prediction, confidence, model_id, match_id)
+		VALUES (%s, %s, %s, %s)
 	"""
-	cursor.execute(query)
-	matches = cursor.fetchall()
+	rows = [(int(p), float(c), model_id, int(m)) for m, p, c in zip(match_ids, predictions, confidences)]
+	cursor.executemany(query, rows)
 
-	list_features = []
-	hth_record = defaultdict(int)
-
-	# Match stats should be ideally in the format (tournament_type, best_of, ranking_diff, hth_diff, rating_diff, KDA_diff, KAST_diff, ADR_diff, label, match_id) 
-	# where label is 1 if teamA wins and 0 if teamA loses
-	for match in matches:
-		match_id = match[0]
-		match_date = match[1]
-		tournament_type = match[2]
-		best_of = match[3]
-		a_team = match[4]
-		b_team = match[5]
-		match_outcome = match[6]
 
-		a_ranking = get_team_ranking(cursor, a_team, match_date)
-		b_ranking = get_team_ranking(cursor, b_team, match_date)
+def db_delete_live_predictions(cursor, match_ids, model_id):
+	placeholders = ", ".join(["%s"] * len(match_ids))
+	params = tuple(int(m) for m in match_ids) + (model_id,)
+	for table_name in ("match_predictions", "live_feature_vectors"):
+		cursor.execute(f"DELETE FROM {table_name} WHERE match_id IN ({placeholders}) AND model_id = %s", params)
 
-		team_a_stats = get_past_stats(cursor, a_team, match_date)
-		team_b_stats = get_past_stats(cursor, b_team, match_date)
 
-		if (a_ranking == None or b_ranking == None or team_a_stats[0] == None or team_b_stats[0] == None):
-			continue
+# Predictions and their live feature vectors for a batch of matches, committed together. Rows a model already had
+# for these matches are replaced, so rescoring a match never leaves duplicates. Returns whether the write committed
+def db_write_live_predictions(db, match_ids, X_scaled, predictions, confidences, model_id):
+	return db_write_live_prediction_sets(db, [(model_id, match_ids, X_scaled, predictions, confidences)])
 
-		ranking_diff = a_ranking - b_ranking
-		ranking_diff = math.copysign(math.log(abs(ranking_diff) + 1), ranking_diff)
 
-		aHthWins = hth_record[(a_team, b_team)]
-		bHthWins = hth_record[(b_team, a_team)]
+# Several models' batches, each (model_id, match_ids, X_scaled, predictions, confidences), in one transaction
+def db_write_live_prediction_sets(db, prediction_sets):
+	prediction_sets = [s for s in prediction_sets if len(s[1]) > 0]
+	if not prediction_sets:
+		return True
+	cursor = db.cursor()
 
-		hth_diff = aHthWins - bHthWins
-		
-		rating_diff = team_a_stats[0] - team_b_stats[0]
-		KDA_diff = team_a_stats[1] - team_b_stats[1]
-		KAST_diff = team_a_stats[2] - team_b_stats[2]
-		ADR_diff = team_a_stats[3] - team_b_stats[3]
+	try:
+		for model_id, match_ids, X_scaled, predictions, confidences in prediction_sets:
+			db_delete_live_predictions(cursor, match_ids, model_id)
+			db_insert_predictions(cursor, match_ids, predictions, confidences, model_id)
+			db_insert_feature_vectors(cursor, match_ids, X_scaled, "live", model_id)
+		db.commit()
+		return True
+	except Exception as e:
+		print("Error inserting live predictions:", e)
+		db.rollback()
+		return False
+	finally:
+		cursor.close()
 
 
-		# Append aggregate stats
-		x = [
-			tournament_type, best_of, ranking_diff, hth_diff,
-			rating_diff, KDA_diff, KAST_diff, ADR_diff,
-			match_outcome, match_id
-		]
+def insert_model_metrics(cursor, model_name, metrics):
+	date = datetime.date.today()
 
-		# Checks for any null values
-		if any(val is None for val in x):
-			continue
+	query = """
+	INSERT INTO
+		model
+		(model_name, date, t_neg, f_neg, t_pos, f_pos, loss, roc_auc)
+	VALUES
+		(%s, %s, %s, %s, %s, %s, %s, %s)
+	"""
 
-		if match_outcome == 1:
-			hth_record[(a_team, b_team)] += 1
-		else:
-			hth_record[(b_team, a_team)] += 1
+	cursor.execute(query, (model_name, date, metrics['confusion_matrix'][0][0], metrics['confusion_matrix'][1][0], metrics['confusion_matrix'][1][1], metrics['confusion_matrix'][0][1], metrics['loss'], metrics['ROC AUC']))
 
-		list_features.append(x)
 
-	cursor.close()
-	db.close()
+# Brings the feature store for `feature_set` up to date and returns every stored row
+def load_feature_frame(feature_set, snapshot=None):
+	if snapshot is not None:
+		return update_feature_store(None, feature_set, snapshot=snapshot)
 
-	return list_features
+	with db_cursor() as cursor:
+		return update_feature_store(cursor, feature_set)
 
 
-def process_matches_nn():
+def process_matches(snapshot=None):
 	print("Beginning to process matches...")
-	db = db_connect()
-	scaler = StandardScaler()
-	cursor = db.cursor(dictionary=True)
-
-	query = """
-	SELECT 
-		match_id, 
-		date, 
-		tournament_type, 
-		best_of, 
-		team_a,
-		team_b,
-		outcome 
-	FROM matches
-	ORDER BY date asc
-	"""
-
-	cursor.execute(query)
-	rows = cursor.fetchall()
-	df = pd.DataFrame(rows)
-
-	# Initialize feature columns
-	new_columns = [
-    'ranking_diff', 'rating_diff', 'KDA_diff', 'KAST_diff', 'ADR_diff',
-    'round_wr_diff', 'opening_kill_rate_diff', 'multikill_rate_diff',
-    '5v4_wr_diff', '4v5_wr_diff', 'trade_rate_diff', 'utility_adr_diff',
-    'flash_assists_diff', 'pistol_wr_diff', 'round2_conv_diff',
-    'round2_break_diff', 'hth_wins_diff'
-	]
+	df = load_feature_frame("lr", snapshot)
 
-	for col in new_columns:
-		df[col] = None
-
-	hth_record = defaultdict(int)
+	# Match stats should be ideally in the format (tournament_type, best_of, ranking_diff, hth_diff, rating_diff, KDA_diff, KAST_diff, ADR_diff, label, match_id) 
+	# where label is 1 if teamA wins and 0 if teamA loses
+	df = df.copy()
+	df['hth_wins_diff'] = df['hth_wins_diff'].astype(int)
+	df['outcome'] = df['outcome'].astype(int)
 
-	for idx, row in df.iterrows():
-		a_team = row['team_a']
-		b_team = row['team_b']
-		match_date = row['date']
+	list_features = df[LR_FEATURES + ['outcome', 'match_id']].astype(object).values.tolist()
 
-		team_a_stats = get_team_stats_by_date(cursor, a_team, match_date)
-		team_b_stats = get_team_stats_by_date(cursor, b_team, match_date)
+	return list_features
 
-		team_a_player_stats = get_past_stats(cursor, a_team, match_date)
-		team_b_player_stats = get_past_stats(cursor, b_team, match_date)
 
-		aHthWins = hth_record[(a_team, b_team)]
-		bHthWins = hth_record[(b_team, a_team)]
+def process_matches_nn(snapshot=None):
+	print("Beginning to process matches...")
+	scaler = StandardScaler()
+	df = load_feature_frame("nn", snapshot)
 
-		try:
-			ranking_diff = team_a_stats['ranking'] - team_b_stats['ranking']
-			ranking_diff = math.copysign(math.log(abs(ranking_diff) + 1), ranking_diff)
-			round_wr_diff = team_a_stats['round_wr'] - team_b_stats['round_wr']
-			opening_kill_rate_diff = team_a_stats['opening_kill_rate'] - team_b_stats['opening_kill_rate']
-			multikill_rate_diff = team_a_stats['multikill_rate'] - team_b_stats['multikill_rate']
-			_5v4_wr_diff = team_a_stats['5v4_wr'] - team_b_stats['5v4_wr']
-			_4v5_wr_diff = team_a_stats['4v5_wr'] - team_b_stats['4v5_wr']
-			trade_rate_diff = team_a_stats['trade_rate'] - team_b_stats['trade_rate']
-			utility_adr_diff = team_a_stats['utility_adr'] - team_b_stats['utility_adr']
-			flash_assists_diff = team_a_stats['flash_assists'] - team_b_stats['flash_assists']
-			pistol_wr_diff = team_a_stats['pistol_wr'] - team_b_stats['pistol_wr']
-			round2_conv_diff = team_a_stats['round2_conv'] - team_b_stats['round2_conv']
-			round2_break_diff = team_a_stats['round2_break'] - team_b_stats['round2_break']
-			rating_diff = team_a_player_stats['team_rating'] - team_b_player_stats['team_rating']
-			KDA_diff = team_a_player_stats['avg_kda'] - team_b_player_stats['avg_kda']
-			KAST_diff = team_a_player_stats['avg_kast'] - team_b_player_stats['avg_kast']
-			ADR_diff = team_a_player_stats['avg_adr'] - team_b_player_stats['avg_adr']
-			hth_diff = aHthWins - bHthWins
-
-			df.at[idx, 'ranking_diff'] = ranking_diff
-			df.at[idx, 'rating_diff'] = rating_diff
-			df.at[idx, 'KDA_diff'] = KDA_diff
-			df.at[idx, 'KAST_diff'] = KAST_diff
-			df.at[idx, 'ADR_diff'] = ADR_diff
-			df.at[idx, 'round_wr_diff'] = round_wr_diff
-			df.at[idx, 'opening_kill_rate_diff'] = opening_kill_rate_diff
-			df.at[idx, 'multikill_rate_diff'] = multikill_rate_diff
-			df.at[idx, '5v4_wr_diff'] = _5v4_wr_diff
-			df.at[idx, '4v5_wr_diff'] = _4v5_wr_diff
-			df.at[idx, 'trade_rate_diff'] = trade_rate_diff
-			df.at[idx, 'utility_adr_diff'] = utility_adr_diff
-			df.at[idx, 'flash_assists_diff'] = flash_assists_diff
-			df.at[idx, 'pistol_wr_diff'] = pistol_wr_diff
-			df.at[idx, 'round2_conv_diff'] = round2_conv_diff
-			df.at[idx, 'round2_break_diff'] = round2_break_diff
-			df.at[idx, 'hth_wins_diff'] = hth_diff
-
-			if row['outcome'] == 1:
-				hth_record[(a_team, b_team)] += 1
-			elif row['outcome'] == 0:
-				hth_record[(b_team, a_team)] += 1
-
-		except TypeError as e:
-			continue
-
-	db.close()
-	cursor.close()
-
-	df = df.dropna()
-	X = df.drop(["outcome", "match_id", "date", "team_a", "team_b"], axis=1)
+	X = df[NN_FEATURES]
 	X_scaled = scaler.fit_transform(X)
-	y = df["outcome"]
+	y = df["outcome"].astype(int)
 	X_match_id = df["match_id"]
 
 	scaler_path = Path(__file__).resolve().parent / f"nn_model_data/standard_nn_scaler.pkl"
@@ -531,11 +423,7 @@ def create_rolling_accuracy_graph(y_pred, y_true, model_name, stage):
 	plt.close()
 
 
-def create_rolling_feature_metrics(model_name, model_id, stage):
-	db = db_connect()
-	cursor = db.cursor(dictionary=True)
-
-
+def create_rolling_feature_metrics(model_name, model_id, stage, db=None):
 	try:
 		if model_id == 2:
 			numerical_features = [
@@ -603,8 +491,9 @@ def create_rolling_feature_metrics(model_name, model_id, stage):
 					upcoming_matches.date DESC
 			"""
 
-		cursor.execute(query, (model_id,))
-		features = cursor.fetchall()
+		with db_cursor(db, dictionary=True) as cursor:
+			cursor.execute(query, (model_id,))
+			features = cursor.fetchall()
 		
 	except Exception as e:
 		print("Error fetching feature vectors:", e)
@@ -646,11 +535,8 @@ def create_rolling_feature_metrics(model_name, model_id, stage):
 		
 		plt.close()
 
-	db.close()
 
-def create_matches_insertion_graph():
-	db = db_connect()
-	cursor = db.cursor()
+def create_matches_insertion_graph(db=None):
 	try:
 		query = """
 			SELECT 
@@ -658,8 +544,9 @@ def create_matches_insertion_graph():
 			FROM upcoming_matches 
 		"""
 
-		cursor.execute(query)
-		dates = cursor.fetchall()
+		with db_cursor(db) as cursor:
+			cursor.execute(query)
+			dates = cursor.fetchall()
 
 	except Exception as e:
 		print("Error fetching feature vectors:", e)
@@ -689,12 +576,9 @@ def create_matches_insertion_graph():
 	plt.savefig(path)
 	
 	plt.close()
-	db.close()
 	
 
-def create_correlation_matrix(model_name, model_id):
-	db = db_connect()
-	cursor = db.cursor(dictionary=True)
+def create_correlation_matrix(model_name, model_id, db=None):
 	try:
 		query = """
 			SELECT 
@@ -709,8 +593,9 @@ def create_correlation_matrix(model_name, model_id):
 			FROM feature_vectors WHERE model_id = %s
 		"""
 
-		cursor.execute(query, (model_id,))
-		features = cursor.fetchall()
+		with db_cursor(db, dictionary=True) as cursor:
+			cursor.execute(query, (model_id,))
+			features = cursor.fetchall()
 	except Exception as e:
 		print("Error fetching feature vectors:", e)
 		return None
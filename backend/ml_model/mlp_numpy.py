@@ -0,0 +1,44 @@
+import numpy as np
+
+
+# Plain-array copy of a trained MLP (or FoldEnsemble of MLPs), as written by mlp_arrays.
+# Scoring is a few dense matmuls, so prediction processes never need to import torch
+class NumpyMLP:
+  def __init__(self, arrays):
+    self.members = []
+    for member, num_layers in enumerate(arrays['layers']):
+      self.members.append([(arrays[f'weight_{member}_{i}'], arrays[f'bias_{member}_{i}']) for i in range(int(num_layers))])
+
+  def logits(self, X_scaled):
+    h = np.asarray(X_scaled, dtype=np.float32)
+    out = []
+    for layers in self.members:
+      z = h
+      for i, (weight, bias) in enumerate(layers):
+        z = z @ weight + bias
+        if i < len(layers) - 1:
+          z = np.maximum(z, 0)
+      out.append(z.reshape(-1))
+    return np.stack(out)
+
+  # Members' sigmoid outputs averaged, as FoldEnsemble does
+  def predict_proba(self, X_scaled):
+    return np.exp(-np.logaddexp(0, -self.logits(X_scaled).astype(np.float64))).mean(axis=0)
+
+
+# The Linear layers of `model` (an MLP or a FoldEnsemble of them) as named float32 arrays
+def mlp_arrays(model):
+  import torch.nn as nn
+
+  members = list(model.members) if hasattr(model, 'members') else [model]
+  arrays = {}
+  layers = []
+  for member_idx, member in enumerate(members):
+    linears = [layer for layer in member.modules() if isinstance(layer, nn.Linear)]
+    layers.append(len(linears))
+    for i, layer in enumerate(linears):
+      arrays[f'weight_{member_idx}_{i}'] = layer.weight.detach().cpu().numpy().T.astype(np.float32)
+      arrays[f'bias_{member_idx}_{i}'] = layer.bias.detach().cpu().numpy().astype(np.float32)
+  arrays['layers'] = np.asarray(layers, dtype=np.int64)
+
+  return arrays
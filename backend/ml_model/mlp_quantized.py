@@ -0,0 +1,91 @@
+import warnings
+import numpy as np
+import torch
+import torch.nn as nn
+from models.mlp import MLP
+
+try:
+  from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+except ImportError:
+  DynamicQuantizedLinear = None
+
+
+# Quantized tensors and dynamic quantization are deprecated in recent torch releases. int8 inference is only offered
+# while the APIs used to build and rebuild the layers exist; callers fall back to the float model otherwise
+def quantization_supported():
+  return (
+    DynamicQuantizedLinear is not None
+    and hasattr(torch, "_make_per_tensor_quantized_tensor")
+    and hasattr(torch.ao.quantization, "quantize_dynamic")
+  )
+
+
+def require_quantization():
+  if not quantization_supported():
+    raise RuntimeError(f"torch {torch.__version__} no longer provides dynamic int8 quantization, use float inference")
+
+
+# Float MLPs rebuilt from mlp_numpy.mlp_arrays output, one per ensemble member, in eval mode
+def mlps_from_arrays(arrays):
+  members = []
+  for member, num_layers in enumerate(arrays['layers']):
+    weights = [np.asarray(arrays[f'weight_{member}_{i}']) for i in range(int(num_layers))]
+    model = MLP(weights[0].shape[0], [w.shape[1] for w in weights[:-1]], weights[-1].shape[1], 0.0)
+    linears = [layer for layer in model.model if isinstance(layer, nn.Linear)]
+    with torch.no_grad():
+      for i, layer in enumerate(linears):
+        layer.weight.copy_(torch.as_tensor(weights[i].T))
+        layer.bias.copy_(torch.as_tensor(np.asarray(arrays[f'bias_{member}_{i}'])))
+    members.append(model.eval())
+  return members
+
+
+# int8 dynamic quantization: weights stored as int8, activations quantized per batch at run time
+def quantize_mlp(model):
+  require_quantization()
+  with warnings.catch_warnings():
+    warnings.filterwarnings("ignore", message=".*deprecated.*")
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+# The quantized Linear layers of each member as int8 weights plus their scale / zero point and float biases
+def quantized_arrays(members):
+  arrays = {}
+  layers = []
+  for member_idx, member in enumerate(members):
+    linears = [layer for layer in member.modules() if isinstance(layer, DynamicQuantizedLinear)]
+    layers.append(len(linears))
+    for i, layer in enumerate(linears):
+      weight, bias = layer.weight(), layer.bias()
+      arrays[f'weight_{member_idx}_{i}'] = weight.int_repr().numpy()
+      arrays[f'scale_{member_idx}_{i}'] = np.float64(weight.q_scale())
+      arrays[f'zero_point_{member_idx}_{i}'] = np.int64(weight.q_zero_point())
+      arrays[f'bias_{member_idx}_{i}'] = bias.detach().numpy().astype(np.float32)
+  arrays['layers'] = np.asarray(layers, dtype=np.int64)
+  return arrays
+
+
+# Dynamically quantized MLP (or ensemble) rebuilt exactly from quantized_arrays output; scores like NumpyMLP
+class QuantizedMLP:
+  def __init__(self, arrays):
+    require_quantization()
+    self.members = []
+    with warnings.catch_warnings():
+      warnings.filterwarnings("ignore", message=".*deprecated.*")
+      for member, num_layers in enumerate(arrays['layers']):
+        layers = []
+        for i in range(int(num_layers)):
+          int8 = torch.as_tensor(np.array(arrays[f'weight_{member}_{i}']))
+          weight = torch._make_per_tensor_quantized_tensor(int8, float(arrays[f'scale_{member}_{i}']), int(arrays[f'zero_point_{member}_{i}']))
+          layer = DynamicQuantizedLinear(int8.shape[1], int8.shape[0], dtype=torch.qint8)
+          layer.set_weight_bias(weight, torch.as_tensor(np.array(arrays[f'bias_{member}_{i}'])))
+          layers.append(layer)
+          if i < int(num_layers) - 1:
+            layers.append(nn.ReLU())
+        self.members.append(nn.Sequential(*layers).eval())
+
+  def predict_proba(self, X_scaled):
+    X = torch.as_tensor(np.asarray(X_scaled, dtype=np.float32))
+    with torch.no_grad():
+      probs = [torch.sigmoid(member(X)).view(-1) for member in self.members]
+    return torch.stack(probs).mean(dim=0).double().numpy()
@@ -0,0 +1,339 @@
+import json
+import shutil
+import sys
+import time
+import datetime
+import joblib
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from collections import namedtuple
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from sklearn.metrics import accuracy_score, roc_auc_score
+from features import FEATURE_SETS
+from feature_store import FEATURE_SCHEMA_VERSION, load_store
+from mlp_numpy import NumpyMLP, mlp_arrays
+from ml_util import load_model_meta
+
+REGISTRY_DIR = Path(__file__).resolve().parent / "model_registry"
+# Where training saves each feature set's test_data_<date>.npz split (scaled X_test, y_test)
+TEST_DATA_DIRS = {
+	"lr": Path(__file__).resolve().parent / "lr_model_data",
+	"nn": Path(__file__).resolve().parent / "nn_model_data"
+}
+
+# Largest probability difference a fused model may show against the two-step scaler + model path
+FUSE_TOLERANCE = 1e-5
+
+# quantize_model evaluates on rows after the model's watermark when at least this many exist, else on the newest fraction
+QUANTIZE_MIN_EVAL_ROWS = 200
+QUANTIZE_EVAL_FRACTION = 0.2
+
+# Every version is a directory of plain .npy arrays plus a manifest.json linking model, scaler, feature schema and
+# training watermark. Nothing is unpickled on load, and arrays are memory-mapped rather than read up front
+MANIFEST = "manifest.json"
+
+RegisteredModel = namedtuple("RegisteredModel", ["model", "scaler", "manifest"])
+
+
+def model_dir(name):
+	return REGISTRY_DIR / name
+
+
+def version_dir(name, version):
+	return model_dir(name) / f"v{version:04d}"
+
+
+def load_manifest(path):
+	path = Path(path) / MANIFEST
+	if not path.exists():
+		return None
+	with open(path) as f:
+		return json.load(f)
+
+
+def list_versions(name):
+	manifests = [load_manifest(path) for path in model_dir(name).glob("v*") if path.suffix != ".tmp"]
+	return sorted((m for m in manifests if m is not None), key=lambda m: m['version'])
+
+
+def lr_arrays(model):
+	return {'coef': model.coef_, 'intercept': model.intercept_, 'classes': model.classes_}
+
+
+def scaler_arrays(scaler):
+	return {'mean': scaler.mean_, 'scale': scaler.scale_}
+
+
+# Writes a new version of `name`. kind is "logistic_regression" (a fitted LogisticRegression) or "mlp" (an MLP or
+# FoldEnsemble); meta carries the training details (mode, watermark, params, ...) into the manifest
+def register_model(name, kind, model, scaler, feature_set, meta=None):
+	arrays = {
+		'model': lr_arrays(model) if kind == "logistic_regression" else mlp_arrays(model),
+		'scaler': scaler_arrays(scaler)
+	}
+	return write_version(name, kind, arrays, feature_set, meta)
+
+
+def write_version(name, kind, arrays, feature_set, meta=None):
+	versions = list_versions(name)
+	version = versions[-1]['version'] + 1 if versions else 1
+	path = version_dir(name, version)
+
+	# Written under a temp name and renamed, so a half-written version is never resolved
+	tmp_path = path.with_name(path.name + ".tmp")
+	shutil.rmtree(tmp_path, ignore_errors=True)
+	for group, group_arrays in arrays.items():
+		(tmp_path / group).mkdir(parents=True, exist_ok=True)
+		for key, array in group_arrays.items():
+			np.save(tmp_path / group / f"{key}.npy", np.asarray(array))
+
+	# model/trained_at describe the training-side pickle's own .json and would go stale here
+	meta = {key: value for key, value in (meta or {}).items() if key not in ('model', 'trained_at')}
+	manifest = dict(
+		meta,
+		name=name,
+		version=version,
+		kind=kind,
+		feature_set=feature_set,
+		features=FEATURE_SETS[feature_set],
+		feature_schema_version=FEATURE_SCHEMA_VERSION,
+		arrays={group: sorted(group_arrays) for group, group_arrays in arrays.items()},
+		created_at=datetime.datetime.now().isoformat()
+	)
+	with open(tmp_path / MANIFEST, "w") as f:
+		json.dump(manifest, f, indent=4, default=str)
+
+	tmp_path.rename(path)
+	print(f"Registered {name} v{version} ({kind})")
+	return manifest
+
+
+def is_compatible(manifest, feature_set):
+	return manifest['feature_schema_version'] == FEATURE_SCHEMA_VERSION and manifest['features'] == FEATURE_SETS[feature_set]
+
+
+# Manifest of the given version, or of the newest one whose feature schema matches the current code.
+# int8 copies (see quantize_model) are only resolved when `quantized` asks for them
+def resolve(name, feature_set, version=None, quantized=False):
+	if version is not None:
+		manifest = load_manifest(version_dir(name, int(version)))
+		if manifest is None:
+			raise FileNotFoundError(f"No version {version} of {name} in {model_dir(name)}")
+		if not is_compatible(manifest, feature_set):
+			raise ValueError(f"{name} v{version} was trained on a different feature schema")
+		return manifest
+
+	versions = [m for m in list_versions(name) if is_compatible(m, feature_set)]
+	compatible = [m for m in versions if bool(m.get('quantized')) == quantized]
+	if not compatible:
+		variant = "int8 " if quantized else ""
+		raise FileNotFoundError(f"No {variant}{name} model compatible with feature schema v{FEATURE_SCHEMA_VERSION} in {model_dir(name)}")
+
+	# An int8 copy is only current while no float version was trained after the one it was quantized from
+	if quantized:
+		newest_float = [m for m in versions if not m.get('quantized')][-1]
+		source = newest_float.get('fused_from', newest_float['version'])
+		if compatible[-1]['quantized_from'] != source:
+			raise FileNotFoundError(f"int8 {name} v{compatible[-1]['version']} was quantized from v{compatible[-1]['quantized_from']}, but the newest float model is v{source}")
+	return compatible[-1]
+
+
+def load_arrays(manifest, group, mmap=True):
+	path = version_dir(manifest['name'], manifest['version']) / group
+	return {key: np.load(path / f"{key}.npy", mmap_mode="r" if mmap else None, allow_pickle=False) for key in manifest['arrays'][group]}
+
+
+def build_scaler(arrays):
+	scaler = StandardScaler()
+	scaler.mean_ = np.asarray(arrays['mean'])
+	scaler.scale_ = np.asarray(arrays['scale'])
+	scaler.var_ = scaler.scale_ ** 2
+	scaler.n_features_in_ = len(scaler.mean_)
+	return scaler
+
+
+def build_model(kind, arrays, quantized=False):
+	# torch is only imported for the int8 variant
+	if quantized:
+		from mlp_quantized import QuantizedMLP
+		return QuantizedMLP(arrays)
+	if kind == "mlp":
+		return NumpyMLP(arrays)
+
+	model = LogisticRegression()
+	model.coef_ = np.asarray(arrays['coef'])
+	model.intercept_ = np.asarray(arrays['intercept'])
+	model.classes_ = np.asarray(arrays['classes'])
+	model.n_features_in_ = model.coef_.shape[1]
+	return model
+
+
+# (model, scaler, manifest) for the newest compatible version of `name` (its int8 copy with quantized=True), or the pinned `version`.
+# A fused model (manifest['fused']) takes raw features; its scaler only maps them to the stored feature-vector scale
+def load_registered_model(name, feature_set, version=None, quantized=False):
+	manifest = resolve(name, feature_set, version, quantized)
+	model = build_model(manifest['kind'], load_arrays(manifest, 'model'), bool(manifest.get('quantized')))
+	scaler = build_scaler(load_arrays(manifest, 'scaler'))
+	return RegisteredModel(model, scaler, manifest)
+
+
+# Probability of a team_a win: LogisticRegression returns both classes, NumpyMLP only the positive one
+def predict_proba(model, X):
+	probs = model.predict_proba(X)
+	return probs[:, 1] if probs.ndim == 2 else probs
+
+
+# Model arrays with the scaler folded in, so they take raw features: for x_scaled = (x - mean) / scale,
+# W @ x_scaled + b == (W / scale) @ x + (b - W @ (mean / scale)). Only the LR weights or each member's first Linear change
+def fold_scaler(kind, model_arrays, scaler_arrays):
+	mean = np.asarray(scaler_arrays['mean'], dtype=np.float64)
+	scale = np.asarray(scaler_arrays['scale'], dtype=np.float64)
+	arrays = {key: np.array(value) for key, value in model_arrays.items()}
+
+	if kind == "logistic_regression":
+		coef = arrays['coef'].astype(np.float64) / scale
+		arrays['intercept'] = arrays['intercept'] - coef @ mean
+		arrays['coef'] = coef
+		return arrays
+
+	for member in range(len(arrays['layers'])):
+		weight = arrays[f'weight_{member}_0'].astype(np.float64) / scale[:, None]
+		bias = arrays[f'bias_{member}_0'].astype(np.float64) - mean @ weight
+		arrays[f'weight_{member}_0'] = weight.astype(np.float32)
+		arrays[f'bias_{member}_0'] = bias.astype(np.float32)
+	return arrays
+
+
+# Raw feature rows to check a fused model on: the newest saved test split of the feature set (stored scaled, so it is
+# mapped back through the scaler), else rows drawn around the scaler's mean
+def verification_data(feature_set, scaler, rows=1000):
+	test_data = sorted(TEST_DATA_DIRS[feature_set].glob("test_data_*.npz"), key=lambda path: path.stat().st_mtime)
+	if test_data:
+		with np.load(test_data[-1]) as data:
+			if data['X_test'].shape[1] == scaler.n_features_in_:
+				return scaler.inverse_transform(data['X_test'])
+
+	rng = np.random.default_rng(0)
+	return scaler.mean_ + scaler.scale_ * rng.standard_normal((rows, scaler.n_features_in_))
+
+
+# Largest probability difference between the fused model on raw rows and the model on scaled rows
+def verify_fused(kind, model_arrays, fused_arrays, scaler, X_raw):
+	two_step = predict_proba(build_model(kind, model_arrays), scaler.transform(X_raw))
+	fused = predict_proba(build_model(kind, fused_arrays), X_raw)
+	return float(np.abs(two_step - fused).max())
+
+
+# Registers a fused copy of a version (default: the newest compatible one) after checking it matches the
+# two-step path within `tolerance` on verification_data
+def fuse_model(name, version=None, tolerance=FUSE_TOLERANCE):
+	base = resolve(name, name, version)
+	if base.get('fused'):
+		print(f"{name} v{base['version']} is already fused")
+		return base
+
+	model_arrays = load_arrays(base, 'model', mmap=False)
+	scaler_arrays = load_arrays(base, 'scaler', mmap=False)
+	scaler = build_scaler(scaler_arrays)
+	fused_arrays = fold_scaler(base['kind'], model_arrays, scaler_arrays)
+
+	X_raw = verification_data(base['feature_set'], scaler)
+	max_diff = verify_fused(base['kind'], model_arrays, fused_arrays, scaler, X_raw)
+	print(f"Fused {name} v{base['version']}: max probability difference {max_diff:.2e} over {len(X_raw)} rows")
+	if max_diff > tolerance:
+		raise ValueError(f"Fused {name} v{base['version']} differs from the two-step model by {max_diff:.2e}")
+
+	registry_keys = ('name', 'version', 'kind', 'feature_set', 'features', 'feature_schema_version', 'arrays', 'created_at')
+	meta = {key: value for key, value in base.items() if key not in registry_keys}
+	meta.update(fused=True, fused_from=base['version'], fused_max_diff=max_diff)
+	return write_version(name, base['kind'], {'model': fused_arrays, 'scaler': scaler_arrays}, base['feature_set'], meta)
+
+
+# (raw X, y) to compare a model's variants on: feature store rows dated after the model's watermark, which it never
+# saw, or the newest QUANTIZE_EVAL_FRACTION of stored rows when there are too few of those
+def evaluation_data(manifest):
+	store = load_store(manifest['feature_set'])
+	if store is None or store['features'] is None:
+		raise FileNotFoundError(f"No {manifest['feature_set']} feature store to evaluate on")
+
+	df = store['features'].sort_values('date', kind='stable')
+	unseen = df[df['date'] > pd.Timestamp(manifest['watermark'])] if manifest.get('watermark') else df.iloc[:0]
+	if len(unseen) >= QUANTIZE_MIN_EVAL_ROWS:
+		df, split = unseen, "after_watermark"
+	else:
+		df, split = df.iloc[-max(1, int(len(df) * QUANTIZE_EVAL_FRACTION)):], "newest_rows"
+
+	X = df[manifest['features']].astype(float).to_numpy()
+	return X, df['outcome'].astype(int).to_numpy(), split
+
+
+def _rows_per_second(model, X_scaled, repeats=5):
+	start = time.perf_counter()
+	for _ in range(repeats):
+		predict_proba(model, X_scaled)
+	return repeats * len(X_scaled) / (time.perf_counter() - start)
+
+
+# Registers an int8 dynamically quantized copy of an MLP version (default: the newest unfused float one) and records
+# its accuracy / ROC AUC against the float model in the manifest. Live scoring picks it up with NN_INFERENCE=int8
+def quantize_model(name, version=None, X_raw=None, y=None):
+	from mlp_quantized import mlps_from_arrays, quantize_mlp, quantized_arrays
+
+	if version is not None:
+		base = resolve(name, name, version)
+	else:
+		candidates = [m for m in list_versions(name) if is_compatible(m, name) and not m.get('fused') and not m.get('quantized')]
+		if not candidates:
+			raise FileNotFoundError(f"No unfused float {name} model to quantize in {model_dir(name)}")
+		base = candidates[-1]
+	if base['kind'] != "mlp" or base.get('fused') or base.get('quantized'):
+		raise ValueError(f"{name} v{base['version']} is not an unfused float MLP")
+
+	model_arrays = load_arrays(base, 'model', mmap=False)
+	scaler_arrays = load_arrays(base, 'scaler', mmap=False)
+	scaler = build_scaler(scaler_arrays)
+	arrays = quantized_arrays([quantize_mlp(member) for member in mlps_from_arrays(model_arrays)])
+
+	split = "given"
+	if X_raw is None:
+		X_raw, y, split = evaluation_data(base)
+	X_scaled = scaler.transform(X_raw)
+
+	float_model = build_model("mlp", model_arrays)
+	int8_model = build_model("mlp", arrays, quantized=True)
+	float_probs = predict_proba(float_model, X_scaled)
+	int8_probs = predict_proba(int8_model, X_scaled)
+
+	metrics = {'eval_rows': len(y), 'eval_split': split, 'max_prob_diff': float(np.abs(float_probs - int8_probs).max())}
+	for metric, score in (('accuracy', lambda p: accuracy_score(y, p >= 0.5)), ('roc_auc', lambda p: roc_auc_score(y, p))):
+		try:
+			metrics[f'float_{metric}'], metrics[f'int8_{metric}'] = float(score(float_probs)), float(score(int8_probs))
+			metrics[f'{metric}_delta'] = metrics[f'int8_{metric}'] - metrics[f'float_{metric}']
+		except ValueError as e:
+			print(f"Skipping {metric}:", e)
+
+	print(f"Quantized {name} v{base['version']} on {len(y)} {split} rows: " + ", ".join(f"{key} {value:.4f}" for key, value in metrics.items() if isinstance(value, float)))
+	print(f"Float {_rows_per_second(float_model, X_scaled):,.0f} rows/s, int8 {_rows_per_second(int8_model, X_scaled):,.0f} rows/s")
+
+	registry_keys = ('name', 'version', 'kind', 'feature_set', 'features', 'feature_schema_version', 'arrays', 'created_at')
+	meta = {key: value for key, value in base.items() if key not in registry_keys}
+	meta.update(quantized="int8", quantized_from=base['version'], quantization=metrics)
+	return write_version(name, "mlp", {'model': arrays, 'scaler': scaler_arrays}, base['feature_set'], meta)
+
+
+# python model_registry.py import <lr|nn> <model.pkl> <scaler.pkl>: registers a model pickled before the registry existed
+# python model_registry.py fuse <lr|nn> [version]: registers a fused copy of the newest (or given) version
+# python model_registry.py quantize nn [version]: registers an int8 copy of the newest unfused (or given) version
+if __name__ == "__main__":
+	command, feature_set = sys.argv[1], sys.argv[2]
+	if command == "fuse":
+		fuse_model(feature_set, sys.argv[3] if len(sys.argv) > 3 else None)
+	elif command == "quantize":
+		quantize_model(feature_set, sys.argv[3] if len(sys.argv) > 3 else None)
+	else:
+		model_path, scaler_path = Path(sys.argv[3]), Path(sys.argv[4])
+		kind = "logistic_regression" if feature_set == "lr" else "mlp"
+		meta = dict(load_model_meta(model_path) or {'mode': 'imported'}, source_model=model_path.name)
+		register_model(feature_set, kind, joblib.load(model_path), joblib.load(scaler_path), feature_set, meta)
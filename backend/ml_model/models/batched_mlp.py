@@ -0,0 +1,91 @@
+import torch.nn as nn
+import torch
+from models.mlp import MLP
+
+
+# N MLPs that share a hidden layout, stored as stacked [N, in, out] weights so one bmm runs every model.
+# Each model keeps its own dropout rate; build it from MLP instances so every member keeps its own init
+class BatchedMLP(nn.Module):
+  def __init__(self, models, dropouts):
+    super(BatchedMLP, self).__init__()
+    linears = [[layer for layer in model.model if isinstance(layer, nn.Linear)] for model in models]
+
+    self.weights = nn.ParameterList()
+    self.biases = nn.ParameterList()
+    for layer_idx in range(len(linears[0])):
+      self.weights.append(nn.Parameter(torch.stack([layers[layer_idx].weight.detach().t() for layers in linears]).contiguous()))
+      self.biases.append(nn.Parameter(torch.stack([layers[layer_idx].bias.detach() for layers in linears]).unsqueeze(1).contiguous()))
+
+    self.register_buffer("dropouts", torch.as_tensor(dropouts, dtype=torch.float32).view(-1, 1, 1))
+    self.hidden_units = [w.shape[2] for w in self.weights[:-1]]
+
+  def __len__(self):
+    return self.weights[0].shape[0]
+
+  # x is [batch, features] shared by all models, or [N, batch, features]; returns [N, batch, output]
+  def forward(self, x):
+    h = x.expand(len(self), *x.shape) if x.dim() == 2 else x
+    last = len(self.weights) - 1
+
+    for layer_idx, (weight, bias) in enumerate(zip(self.weights, self.biases)):
+      h = torch.baddbmm(bias, h, weight)
+      if layer_idx < last:
+        h = torch.relu(h)
+        if self.training:
+          keep = 1 - self.dropouts
+          h = h * (torch.rand_like(h) < keep) / keep.clamp(min=1e-6)
+
+    return h
+
+  # Plain MLPs carrying the trained weights, one per stacked model
+  def to_models(self):
+    models = []
+    input_size = self.weights[0].shape[1]
+    output_size = self.weights[-1].shape[2]
+
+    for idx in range(len(self)):
+      model = MLP(input_size, self.hidden_units, output_size, float(self.dropouts[idx]))
+      linears = [layer for layer in model.model if isinstance(layer, nn.Linear)]
+      with torch.no_grad():
+        for layer, weight, bias in zip(linears, self.weights, self.biases):
+          layer.weight.copy_(weight[idx].t())
+          layer.bias.copy_(bias[idx, 0])
+      models.append(model)
+
+    return models
+
+
+# Adam/SGD over stacked parameters with one learning rate per model. Matches torch.optim defaults per slice
+class BatchedOptimizer:
+  def __init__(self, params, optimizer, learning_rates, betas=(0.9, 0.999), eps=1e-8):
+    self.params = list(params)
+    self.optimizer = optimizer
+    self.learning_rates = torch.as_tensor(learning_rates, dtype=torch.float32, device=self.params[0].device)
+    self.betas = betas
+    self.eps = eps
+    self.step_count = 0
+    self.state = [(torch.zeros_like(p), torch.zeros_like(p)) for p in self.params]
+
+  def zero_grad(self):
+    for p in self.params:
+      p.grad = None
+
+  @torch.no_grad()
+  def step(self):
+    self.step_count += 1
+    beta1, beta2 = self.betas
+    bias_correction1 = 1 - beta1 ** self.step_count
+    bias_correction2 = 1 - beta2 ** self.step_count
+
+    for p, (exp_avg, exp_avg_sq) in zip(self.params, self.state):
+      if p.grad is None:
+        continue
+      lr = self.learning_rates.view(-1, *([1] * (p.dim() - 1)))
+
+      if self.optimizer == "Adam":
+        exp_avg.mul_(beta1).add_(p.grad, alpha=1 - beta1)
+        exp_avg_sq.mul_(beta2).addcmul_(p.grad, p.grad, value=1 - beta2)
+        denom = exp_avg_sq.sqrt() / (bias_correction2 ** 0.5) + self.eps
+        p.sub_(lr / bias_correction1 * exp_avg / denom)
+      else:
+        p.sub_(lr * p.grad)
@@ -0,0 +1,14 @@
+import torch.nn as nn
+import torch
+
+
+# Averages the probabilities of the cross-validation fold models. Returns logits like MLP does,
+# so prediction code keeps applying sigmoid to the output
+class FoldEnsemble(nn.Module):
+  def __init__(self, members):
+    super(FoldEnsemble, self).__init__()
+    self.members = nn.ModuleList(members)
+
+  def forward(self, x):
+    probs = torch.stack([torch.sigmoid(member(x)) for member in self.members]).mean(dim=0)
+    return torch.logit(probs, eps=1e-7)
\ No newline at end of file
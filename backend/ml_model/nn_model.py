@@ -1,15 +1,48 @@
 import pandas as pd
 import json
+import joblib
 import numpy as np
 import torch
 from pathlib import Path
 import torch.nn as nn
 import torch.optim as optim
+import torch.multiprocessing as mp
+import os
+import math
+from concurrent.futures import ProcessPoolExecutor
 from models.mlp import MLP
-from torch.utils.data import DataLoader, TensorDataset
+from models.batched_mlp import BatchedMLP, BatchedOptimizer
+from models.ensemble import FoldEnsemble
+from search_log import SearchLog, dataset_hash, search_log_path
+from walk_forward import walk_forward_windows, new_train_rows
+from model_registry import register_model
 from sklearn.model_selection import KFold
 from sklearn.metrics import accuracy_score, roc_auc_score, confusion_matrix
-from ml_util import db_connect, save_object, getDateStamp, db_insert_feature_vector, insert_model_metrics, create_class_seperation_quality_plot, create_class_representation_bar_graph, create_cumm_accuracy_graph, create_rolling_accuracy_graph
+from features import NN_FEATURES
+from feature_store import store_watermark
+from ml_util import db_connect, save_object, getDateStamp, save_model_meta, save_model_scaler, latest_model, load_feature_frame, db_replace_training_feature_vectors, insert_model_metrics, create_class_seperation_quality_plot, create_class_representation_bar_graph, create_cumm_accuracy_graph, create_rolling_accuracy_graph
+
+
+# Mini-batches over tensors that stay resident: one permutation gather per epoch, then contiguous slices.
+# Stands in for DataLoader(TensorDataset(X, y)) without per-sample indexing and collation
+class TensorBatches:
+  def __init__(self, X, y, batch_size, shuffle=False):
+    self.X = X
+    self.y = y
+    self.batch_size = max(1, min(batch_size, len(X)))
+    self.shuffle = shuffle
+
+  def __len__(self):
+    return math.ceil(len(self.X) / self.batch_size)
+
+  def __iter__(self):
+    X, y = self.X, self.y
+    if self.shuffle:
+      perm = torch.randperm(len(X))
+      X, y = X[perm], y[perm]
+
+    for start in range(0, len(X), self.batch_size):
+      yield X[start:start + self.batch_size], y[start:start + self.batch_size]
 
 
 def train_epoch(model, train_loader, criterion, optimizer, device):
@@ -26,6 +59,66 @@ def train_epoch(model, train_loader, criterion, optimizer, device):
   return epoch_train_loss / len(train_loader)
 
 
+# train_epoch for a BatchedMLP: each model's mean loss is summed, so every model gets exactly its own gradient
+def train_batched_epoch(model, train_loader, criterion, optimizer, device):
+  model.train()
+  epoch_train_loss = 0
+  for inputs, labels in train_loader:
+    inputs, labels = inputs.to(device), labels.to(device).float()
+    optimizer.zero_grad()
+    outputs = model(inputs)
+    loss = criterion(outputs, labels.view(1, -1, 1).expand_as(outputs)).mean(dim=(1, 2)).sum()
+    loss.backward()
+    optimizer.step()
+    epoch_train_loss += loss.item()
+  return epoch_train_loss / len(train_loader)
+
+
+# Per-model mean validation loss of a BatchedMLP, averaged over batches like evaluate_model_on_fold
+def batched_validation_loss(model, val_loader, device):
+  model.eval()
+  criterion = nn.BCEWithLogitsLoss(reduction='none')
+  total = torch.zeros(len(model))
+
+  with torch.no_grad():
+    for inputs, labels in val_loader:
+      outputs = model(inputs.to(device))
+      total += criterion(outputs, labels.to(device).float().view(1, -1, 1).expand_as(outputs)).mean(dim=(1, 2)).cpu()
+
+  return (total / max(1, len(val_loader))).numpy()
+
+
+# Patience-based early stopping on validation loss for `size` models trained side by side.
+# update() returns which models improved by more than min_delta this epoch; a model stops after `patience` epochs without one
+class EarlyStopping:
+  def __init__(self, patience, min_delta=0.0, size=1):
+    self.patience = patience
+    self.min_delta = min_delta
+    self.best_loss = np.full(size, np.inf)
+    self.best_epoch = np.zeros(size, dtype=int)
+    self.wait = np.zeros(size, dtype=int)
+    self.stopped = np.zeros(size, dtype=bool)
+
+  def update(self, epoch, losses):
+    losses = np.atleast_1d(np.asarray(losses, dtype=float))
+    improved = ~self.stopped & (losses < self.best_loss - self.min_delta)
+
+    self.best_loss[improved] = losses[improved]
+    self.best_epoch[improved] = epoch
+    self.wait[improved] = 0
+    self.wait[~improved & ~self.stopped] += 1
+    self.stopped |= self.wait >= self.patience
+    return improved
+
+  @property
+  def done(self):
+    return bool(self.stopped.all())
+
+  # Epoch to report for each model; models that never improved keep the full budget
+  def chosen_epochs(self, epochs):
+    return [int(e) if np.isfinite(loss) else epochs for e, loss in zip(self.best_epoch, self.best_loss)]
+
+
 def evaluate_model_on_fold(model, val_loader, criterion, device):
   model.eval()
 
@@ -57,140 +150,512 @@ def evaluate_model_on_fold(model, val_loader, criterion, device):
   calculated_roc_auc = roc_auc_score(all_labels_np, all_probs_np)
   cm = confusion_matrix(all_labels_np, predictions_fold)
 
-  return calculated_accuracy, calculated_loss, calculated_roc_auc, cm
+  return calculated_accuracy, calculated_loss, calculated_roc_auc, cm, all_probs_np
 
 
-def nn_cross_validate(X, y, X_match_id):
-  db = db_connect()
-  cursor = db.cursor()
+HYPERPARAMETERS = {
+  "hidden_units": [[64], [64, 128], [128], [256, 128], [256], [512, 256, 128]],
+  "optimizer": ["Adam", "SGD"],
+  "dropout": [0.0, 0.2, 0.4],
+  "learning_rate": [0.0005, 0.001, 0.005, 0.01, 0.1],
+  "batch_size": [64, 128, 256],
+  "epochs": 20
+}
 
-  X_data_tensor = torch.as_tensor(X, dtype=torch.float32)
-  y_data_tensor = torch.as_tensor(y, dtype=torch.float32)
+SEARCH_SEED = 42
 
-  num_folds = 5
-  kf = KFold(n_splits=num_folds, shuffle=True, random_state=42)
-  device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+NN_MODEL_DIR = Path(__file__).resolve().parent / "nn_model_data"
 
-  hyperparameters = {
-    "hidden_units": [[64], [64, 128], [128], [256, 128], [256], [512, 256, 128]],
-    "optimizer": ["Adam", "SGD"],
-    "dropout": [0.0, 0.2, 0.4],
-    "learning_rate": [0.0005, 0.001, 0.005, 0.01, 0.1],
-    "batch_size": [64, 128, 256],
-    "epochs": 20
-  }
+# Update mode: fine-tuning epochs, and how many older matches are replayed per new match so the model doesn't drift onto them alone
+UPDATE_EPOCHS = 3
+UPDATE_REPLAY = 4
 
-  all_configurations_results = []
-  config_idx = 0
-  total_configurations = len(hyperparameters["dropout"]) * len(hyperparameters["learning_rate"]) * len(hyperparameters["batch_size"]) * len(hyperparameters["hidden_units"]) * len(hyperparameters["optimizer"])
-
-  print(f"\nStarting Hyperparameter Tuning with {num_folds}-Fold Cross-Validation.")
-
-  for current_dropout_rate in hyperparameters["dropout"]:
-      for current_lr in hyperparameters["learning_rate"]:
-          for current_batch_size in hyperparameters["batch_size"]:
-            for current_hidden_units in hyperparameters["hidden_units"]:
-              for current_optimizer in hyperparameters["optimizer"]:
-                config_idx += 1
-                print(f"Configuration {config_idx}/{total_configurations}")
-                print(f"Parameters: Dropout={current_dropout_rate}, LR={current_lr}, BatchSize={current_batch_size}, HiddenUnits={current_hidden_units}, Optimizer={current_optimizer}")
-
-                fold_val_accuracies = []
-                fold_loss = []
-                fold_roc_auc = []
-                fold_confusion_matrix = []
-
-                for fold, (train_index, val_index) in enumerate(kf.split(X_data_tensor, y_data_tensor)):
-                  X_train_fold, X_val_fold = X_data_tensor[train_index], X_data_tensor[val_index]
-                  y_train_fold, y_val_fold = y_data_tensor[train_index], y_data_tensor[val_index]
-
-                  train_dataset_fold = TensorDataset(X_train_fold, y_train_fold)
-                  val_dataset_fold = TensorDataset(X_val_fold, y_val_fold)
-                  
-                  effective_train_batch_size = max(1, min(current_batch_size, len(train_dataset_fold)))
-                  effective_val_batch_size = max(1, min(current_batch_size, len(val_dataset_fold)))
-
-                  train_loader_fold = DataLoader(train_dataset_fold, batch_size=effective_train_batch_size, shuffle=True)
-                  val_loader_fold = DataLoader(val_dataset_fold, batch_size=effective_val_batch_size, shuffle=False)
-
-                  model = MLP(X_data_tensor.shape[1], current_hidden_units, 1, current_dropout_rate).to(device)
-                  criterion = nn.BCEWithLogitsLoss()
-                  optimizer = (optim.Adam if current_optimizer == 'Adam' else optim.SGD)(
-                      model.parameters(), lr=current_lr
-                  )
-
-                  for epoch in range(hyperparameters['epochs']):
-                    loss = train_epoch(model, train_loader_fold, criterion, optimizer, device)
-
-                  val_accuracy, val_loss, val_roc_auc, cm = evaluate_model_on_fold(model, val_loader_fold, criterion, device)
-                  fold_val_accuracies.append(val_accuracy)
-                  fold_loss.append(val_loss)
-                  fold_roc_auc.append(val_roc_auc)
-                  fold_confusion_matrix.append(cm)
-
-                avg_val_accuracy = np.nanmean(fold_val_accuracies)
-                avg_val_loss = np.nanmean(fold_loss)
-                avg_roc_auc = np.nanmean(fold_roc_auc)
-                avg_cm = np.nanmean(np.array(fold_confusion_matrix), axis=0)
-
-                all_configurations_results.append({
-                  'params': {'dropout_rate': current_dropout_rate, 'learning_rate': current_lr, 'batch_size': current_batch_size, 'hidden_units': current_hidden_units, 'optimizer': current_optimizer},
-                  'avg_val_accuracy': avg_val_accuracy,
-                  'loss': avg_val_loss,
-                  'ROC AUC': avg_roc_auc,
-                  'confusion_matrix': avg_cm.tolist()
-                })
-  
-  valid_results = [res for res in all_configurations_results if not np.isnan(res['avg_val_accuracy'])]
+# Default early stopping for the search; None trains every fold for the full epoch budget
+EARLY_STOPPING = {"patience": 3, "min_delta": 1e-4}
 
-  print("\nSorting configurations by descending Accuracy, then descending F1-Score...")
-  best_results_sorted = sorted(valid_results, key=lambda x: (-x['avg_val_accuracy']))
 
-  best_config_overall = best_results_sorted[0]
-  print(best_config_overall['avg_val_accuracy'])
-  
-  best_dropout = best_config_overall['params']['dropout_rate']
-  best_lr = best_config_overall['params']['learning_rate']
-  best_batch_size = best_config_overall['params']['batch_size']
-  best_hidden_units = best_config_overall['params']['hidden_units']
-  best_optimizer = best_config_overall['params']['optimizer']
+# Configurations in the order of the original nested loops
+def search_space(hyperparameters):
+  configs = []
+  for dropout_rate in hyperparameters["dropout"]:
+    for lr in hyperparameters["learning_rate"]:
+      for batch_size in hyperparameters["batch_size"]:
+        for hidden_units in hyperparameters["hidden_units"]:
+          for optimizer in hyperparameters["optimizer"]:
+            configs.append({'dropout_rate': dropout_rate, 'learning_rate': lr, 'batch_size': batch_size, 'hidden_units': hidden_units, 'optimizer': optimizer})
+  return configs
 
-  y_true_all = []
-  y_prob_all = []
 
-  for fold, (train_index, val_index) in enumerate(kf.split(X_data_tensor, y_data_tensor)):
-    X_train_fold, X_val_fold = X_data_tensor[train_index], X_data_tensor[val_index]
-    y_train_fold, y_val_fold = y_data_tensor[train_index], y_data_tensor[val_index]
+# Every (config, fold) seeds torch itself from the config's index in the full grid, so results don't depend on which
+# process runs it, in what order, or which other configs are searched with it
+def task_seed(config_idx, fold, num_folds):
+  return SEARCH_SEED + config_idx * num_folds + fold
 
-    train_dataset_fold = TensorDataset(X_train_fold, y_train_fold)
-    val_dataset_fold = TensorDataset(X_val_fold, y_val_fold)
 
-    train_loader_fold = DataLoader(train_dataset_fold, batch_size=min(best_batch_size, len(train_dataset_fold)), shuffle=True)
-    val_loader_fold = DataLoader(val_dataset_fold, batch_size=min(best_batch_size, len(val_dataset_fold)), shuffle=False)
+# Indices of configs trained together. With batched=True, configs sharing hidden units, optimizer and
+# batch size (differing only in learning rate and dropout) form one group and train as a single BatchedMLP
+def group_configs(configs, batched):
+  if not batched:
+    return [[idx] for idx in range(len(configs))]
 
-    model = MLP(X_data_tensor.shape[1], best_hidden_units, 1, best_dropout).to(device)
-    criterion = nn.BCEWithLogitsLoss()
-    optimizer = (optim.Adam if best_optimizer == 'Adam' else optim.SGD)(
-      model.parameters(), lr=best_lr
-    )
+  groups = {}
+  for idx, params in enumerate(configs):
+    key = (tuple(params['hidden_units']), params['optimizer'], params['batch_size'])
+    groups.setdefault(key, []).append(idx)
+  return list(groups.values())
+
+
+# Train/validation tensors for every fold, sliced once and shared by all configurations
+def make_fold_data(X_data_tensor, y_data_tensor, folds, device):
+  fold_data = []
+  for train_index, val_index in folds:
+    train_index = torch.as_tensor(train_index)
+    val_index = torch.as_tensor(val_index)
+    fold_data.append((
+      X_data_tensor[train_index].to(device), y_data_tensor[train_index].to(device),
+      X_data_tensor[val_index].to(device), y_data_tensor[val_index].to(device)
+    ))
+  return fold_data
+
+
+# Fold results are (accuracy, loss, roc_auc, confusion_matrix, val_probs, chosen epochs or None, state_dict or None).
+# With early stopping the metrics and weights are those of the best validation-loss epoch
+def _cpu_state(model):
+  return {name: tensor.detach().cpu().clone() for name, tensor in model.state_dict().items()}
 
-    for epoch in range(hyperparameters['epochs']):
-      train_epoch(model, train_loader_fold, criterion, optimizer, device)
 
-    model.eval()
+def train_config_fold(fold, params, epochs, device, seed, keep_model=False, stopping=None):
+  torch.manual_seed(seed)
+  X_train_fold, y_train_fold, X_val_fold, y_val_fold = fold
+
+  train_loader_fold = TensorBatches(X_train_fold, y_train_fold, params['batch_size'], shuffle=True)
+  val_loader_fold = TensorBatches(X_val_fold, y_val_fold, params['batch_size'])
+
+  model = MLP(X_train_fold.shape[1], params['hidden_units'], 1, params['dropout_rate']).to(device)
+  criterion = nn.BCEWithLogitsLoss()
+  optimizer = (optim.Adam if params['optimizer'] == 'Adam' else optim.SGD)(
+    model.parameters(), lr=params['learning_rate']
+  )
+
+  stopper = EarlyStopping(**stopping) if stopping else None
+  best = None
+
+  for epoch in range(epochs):
+    train_epoch(model, train_loader_fold, criterion, optimizer, device)
+    if stopper is None:
+      continue
+
+    result = evaluate_model_on_fold(model, val_loader_fold, criterion, device)
+    if stopper.update(epoch + 1, result[1])[0]:
+      best = result, _cpu_state(model)
+    if stopper.done:
+      break
+
+  if best is None:
+    result = evaluate_model_on_fold(model, val_loader_fold, criterion, device)
+    chosen_epochs = epochs if stopper else None
+    return result + (chosen_epochs, _cpu_state(model) if keep_model else None)
+
+  result, state = best
+  return result + (stopper.chosen_epochs(epochs)[0], state if keep_model else None)
+
+
+# One fold for a group of configs, one seed per config. Groups of one train exactly like train_config_fold; larger groups
+# share mini-batches and run every member in one batched forward/backward, then are scored model by model.
+# Each member starts from its own seed's weights; the shared batch order and dropout draws follow the first seed
+def train_group_fold(fold, params_list, epochs, device, seeds, keep_model=False, stopping=None):
+  if len(params_list) == 1:
+    return [train_config_fold(fold, params_list[0], epochs, device, seeds[0], keep_model, stopping)]
+
+  X_train_fold, y_train_fold, X_val_fold, y_val_fold = fold
+  shared = params_list[0]
+  dropouts = [params['dropout_rate'] for params in params_list]
+
+  train_loader_fold = TensorBatches(X_train_fold, y_train_fold, shared['batch_size'], shuffle=True)
+  val_loader_fold = TensorBatches(X_val_fold, y_val_fold, shared['batch_size'])
+
+  members = []
+  for seed, dropout in zip(seeds, dropouts):
+    torch.manual_seed(seed)
+    members.append(MLP(X_train_fold.shape[1], shared['hidden_units'], 1, dropout))
+  torch.manual_seed(seeds[0])
+  model = BatchedMLP(members, dropouts).to(device)
+  optimizer = BatchedOptimizer(model.parameters(), shared['optimizer'], [params['learning_rate'] for params in params_list])
+
+  # Stopped members get a zero learning rate and keep their best-epoch weights in best_params
+  stopper = EarlyStopping(size=len(params_list), **stopping) if stopping else None
+  best_params = [p.detach().clone() for p in model.parameters()]
+
+  for epoch in range(epochs):
+    train_batched_epoch(model, train_loader_fold, nn.BCEWithLogitsLoss(reduction='none'), optimizer, device)
+    if stopper is None:
+      continue
+
+    improved = torch.as_tensor(stopper.update(epoch + 1, batched_validation_loss(model, val_loader_fold, device)), device=device)
+    with torch.no_grad():
+      for best, p in zip(best_params, model.parameters()):
+        best[improved] = p[improved]
+    optimizer.learning_rates[torch.as_tensor(stopper.stopped, device=device)] = 0.0
+    if stopper.done:
+      break
+
+  if stopper is not None:
+    improved_ever = torch.as_tensor(np.isfinite(stopper.best_loss), device=device)
     with torch.no_grad():
-      for inputs, labels in val_loader_fold:
-        inputs = inputs.to(device)
-        labels = labels.to(device).float().unsqueeze(1)
-        outputs = model(inputs)
-        probs = torch.sigmoid(outputs)
+      for best, p in zip(best_params, model.parameters()):
+        p[improved_ever] = best[improved_ever]
+
+  chosen_epochs = stopper.chosen_epochs(epochs) if stopper else [None] * len(params_list)
+  criterion = nn.BCEWithLogitsLoss()
+  return [
+    evaluate_model_on_fold(member.to(device), val_loader_fold, criterion, device) + (member_epochs, _cpu_state(member) if keep_model else None)
+    for member, member_epochs in zip(model.to_models(), chosen_epochs)
+  ]
+
+
+# Per window, the rows it trains on and its validation block, sliced once and shared by all configurations.
+# With "expanding" windows only the rows each window adds are kept, since one model trains forward through them
+def make_window_data(X_data_tensor, y_data_tensor, windows, device, window_mode="expanding"):
+  window_rows = new_train_rows(windows) if window_mode == "expanding" else [train_index for train_index, _ in windows]
+  window_data = []
+  for train_rows, (_, val_index) in zip(window_rows, windows):
+    train_rows = torch.as_tensor(train_rows)
+    val_index = torch.as_tensor(val_index)
+    window_data.append((
+      X_data_tensor[train_rows].to(device), y_data_tensor[train_rows].to(device),
+      X_data_tensor[val_index].to(device), y_data_tensor[val_index].to(device)
+    ))
+  return window_data
+
+
+# Walk-forward for one config. With "expanding" windows a single model keeps training from window to window on only the
+# rows each window adds, so all windows together cost about one pass of `epochs` over the data. A model can't unlearn the
+# rows a "sliding" window drops, so there each window trains a fresh model on exactly its own rows.
+# Either way each window is scored on the block that follows it
+def train_config_walk_forward(window_data, params, epochs, device, seed, window_mode="expanding"):
+  torch.manual_seed(seed)
+  criterion = nn.BCEWithLogitsLoss()
+
+  def fresh_model():
+    model = MLP(window_data[0][0].shape[1], params['hidden_units'], 1, params['dropout_rate']).to(device)
+    optimizer = (optim.Adam if params['optimizer'] == 'Adam' else optim.SGD)(
+      model.parameters(), lr=params['learning_rate']
+    )
+    return model, optimizer
+
+  model, optimizer = fresh_model()
+
+  results = []
+  for window, (X_train, y_train, X_val, y_val) in enumerate(window_data):
+    if window_mode != "expanding" and window > 0:
+      model, optimizer = fresh_model()
+    train_loader = TensorBatches(X_train, y_train, params['batch_size'], shuffle=True)
+    val_loader = TensorBatches(X_val, y_val, params['batch_size'])
+
+    for epoch in range(epochs):
+      train_epoch(model, train_loader, criterion, optimizer, device)
+
+    results.append(evaluate_model_on_fold(model, val_loader, criterion, device) + (None, None))
+
+  return results
 
-        y_true_all.extend(labels.cpu().numpy().flatten())
-        y_prob_all.extend(probs.cpu().numpy().flatten())
 
+def run_walk_forward_search(X_data_tensor, y_data_tensor, windows, configs, epochs, device, log=None, window_mode="expanding"):
+  fold_results = [[None] * len(windows) for _ in configs]
+  window_data = None
+
+  for config_idx, params in enumerate(configs):
+    logged = [log.get(params, epochs, window) for window in range(len(windows))] if log is not None else [None]
+    if all(result is not None for result in logged):
+      fold_results[config_idx] = logged
+      continue
+
+    print(f"Configuration {config_idx + 1}/{len(configs)}: Dropout={params['dropout_rate']}, LR={params['learning_rate']}, BatchSize={params['batch_size']}, HiddenUnits={params['hidden_units']}, Optimizer={params['optimizer']}")
+    if window_data is None:
+      window_data = make_window_data(X_data_tensor, y_data_tensor, windows, device, window_mode)
+    results = train_config_walk_forward(window_data, params, epochs, device, task_seed(config_idx, 0, len(windows)), window_mode)
+    _record_results([config_idx] * len(windows), range(len(windows)), results, configs, epochs, fold_results, log)
+
+  return fold_results
+
+
+# Out-of-fold probabilities are kept aligned with the rows of X (NaN where a fold wasn't run)
+def summarize_config(params, fold_results, folds, num_rows):
+  fold_val_accuracies = [res[0] for res in fold_results]
+  fold_loss = [res[1] for res in fold_results]
+  fold_roc_auc = [res[2] for res in fold_results]
+  fold_confusion_matrix = [res[3] for res in fold_results]
+
+  oof_prob = np.full(num_rows, np.nan)
+  for (train_index, val_index), res in zip(folds, fold_results):
+    oof_prob[val_index] = res[4]
+
+  summary = {
+    'params': params,
+    'avg_val_accuracy': np.nanmean(fold_val_accuracies),
+    'loss': np.nanmean(fold_loss),
+    'ROC AUC': np.nanmean(fold_roc_auc),
+    'confusion_matrix': np.nanmean(np.array(fold_confusion_matrix), axis=0).tolist(),
+    'oof_prob': oof_prob
+  }
+
+  # Epoch count for the final fit, only known when early stopping picked it
+  if all(res[5] is not None for res in fold_results):
+    summary['fold_epochs'] = [int(res[5]) for res in fold_results]
+    summary['epochs'] = max(1, int(round(np.mean(summary['fold_epochs']))))
+
+  if all(res[6] is not None for res in fold_results):
+    summary['fold_models'] = [res[6] for res in fold_results]
+
+  return summary
+
+
+# Drops fold weights of every finished config outside the current top `keep_top_k` by mean accuracy
+def prune_fold_models(fold_results, keep_top_k):
+  finished = [idx for idx, results in enumerate(fold_results) if all(res is not None for res in results)]
+  ranked = sorted(finished, key=lambda idx: -np.nanmean([res[0] for res in fold_results[idx]]))
+
+  for idx in ranked[keep_top_k:]:
+    fold_results[idx] = [res[:6] + (None,) for res in fold_results[idx]]
+
+
+# Worker-side state for parallel search. The fold tensors arrive in shared memory, so every worker reads the parent's pages
+_worker = {}
+
+
+def _init_search_worker(fold_data, epochs, num_threads, keep_models, stopping):
+  torch.set_num_threads(num_threads)
+  _worker.update(fold_data=fold_data, epochs=epochs, keep_models=keep_models, stopping=stopping)
+
+
+def _run_search_task(task):
+  members, fold, params_list, seeds = task
+  results = train_group_fold(_worker['fold_data'][fold], params_list, _worker['epochs'], torch.device("cpu"), seeds, _worker['keep_models'], _worker['stopping'])
+  return members, fold, results
+
+
+# Fills fold_results with what the log already holds for this fold; returns the group members still to train
+def _pending_members(group, fold, configs, epochs, fold_results, log):
+  if log is None:
+    return list(group)
+
+  pending = []
+  for config_idx in group:
+    logged = log.get(configs[config_idx], epochs, fold)
+    if logged is None:
+      pending.append(config_idx)
+    else:
+      fold_results[config_idx][fold] = logged
+  return pending
+
+
+# A group with any member pending retrains whole, since batched members share batch order and dropout draws;
+# only the pending members' results are kept. Groups are logged together, so this only follows a torn log
+def _pending_task(group, fold, configs, epochs, fold_results, log, indices, num_folds):
+  pending = _pending_members(group, fold, configs, epochs, fold_results, log)
+  if not pending:
+    return None
+  seeds = [task_seed(indices[idx], fold, num_folds) for idx in group]
+  return pending, [configs[idx] for idx in group], seeds
+
+
+def _record_group(group, pending, fold, results, configs, epochs, fold_results, log):
+  kept = [(idx, result) for idx, result in zip(group, results) if idx in pending]
+  _record_results([idx for idx, _ in kept], fold, [result for _, result in kept], configs, epochs, fold_results, log)
+
+
+# `fold` is one fold for every result, or one fold per result
+def _record_results(members, fold, results, configs, epochs, fold_results, log):
+  folds = fold if isinstance(fold, range) else [fold] * len(members)
+  for config_idx, result_fold, result in zip(members, folds, results):
+    fold_results[config_idx][result_fold] = result
+    if log is not None:
+      log.append(configs[config_idx], epochs, result_fold, result)
+
+
+# Both runners return fold_results[config_idx][fold]. With a SearchLog, logged results are reused and new ones appended.
+# indices[config_idx] is each config's position in the full grid, which seeds it
+def run_search_parallel(fold_data, configs, groups, epochs, n_workers, indices, keep_top_k=0, log=None, stopping=None):
+  num_threads = max(1, (os.cpu_count() or 1) // n_workers)
+  # Workers train on CPU; the fold tensors are built once and moved to shared memory instead of being sliced per worker
+  fold_data = [tuple(tensor.cpu() for tensor in fold) for fold in fold_data]
+  for fold in fold_data:
+    for tensor in fold:
+      tensor.share_memory_()
+
+  fold_results = [[None] * len(fold_data) for _ in configs]
+  tasks = []
+  pending = {}
+  for group in groups:
+    for fold in range(len(fold_data)):
+      task = _pending_task(group, fold, configs, epochs, fold_results, log, indices, len(fold_data))
+      if task is not None:
+        pending[tuple(group), fold] = task[0]
+        tasks.append((group, fold) + task[1:])
+
+  if not tasks:
+    return fold_results
+
+  ctx = mp.get_context("spawn")
+  with ProcessPoolExecutor(max_workers=n_workers, mp_context=ctx, initializer=_init_search_worker, initargs=(fold_data, epochs, num_threads, keep_top_k > 0, stopping)) as executor:
+    for done, (group, fold, results) in enumerate(executor.map(_run_search_task, tasks, chunksize=len(fold_data)), start=1):
+      _record_group(group, pending[tuple(group), fold], fold, results, configs, epochs, fold_results, log)
+      if done % len(fold_data) == 0 or done == len(tasks):
+        print(f"Finished {done}/{len(tasks)} (configuration group, fold) tasks")
+        if keep_top_k > 0:
+          prune_fold_models(fold_results, keep_top_k)
+
+  return fold_results
+
+
+def run_search_serial(fold_data, configs, groups, epochs, device, indices, keep_top_k=0, log=None, stopping=None):
+  fold_results = [[None] * len(fold_data) for _ in configs]
+  for group_idx, group in enumerate(groups):
+    params_list = [configs[idx] for idx in group]
+    print(f"Configuration group {group_idx + 1}/{len(groups)} ({len(group)} configurations)")
+    for params in params_list:
+      print(f"Parameters: Dropout={params['dropout_rate']}, LR={params['learning_rate']}, BatchSize={params['batch_size']}, HiddenUnits={params['hidden_units']}, Optimizer={params['optimizer']}")
+
+    for fold_idx, fold in enumerate(fold_data):
+      task = _pending_task(group, fold_idx, configs, epochs, fold_results, log, indices, len(fold_data))
+      if task is None:
+        continue
+      pending, params_list, seeds = task
+      results = train_group_fold(fold, params_list, epochs, device, seeds, keep_top_k > 0, stopping)
+      _record_group(group, pending, fold_idx, results, configs, epochs, fold_results, log)
+
+    if keep_top_k > 0:
+      prune_fold_models(fold_results, keep_top_k)
+
+  return fold_results
+
+
+# keep_top_k > 0 also returns the fold model weights of the best `keep_top_k` configs.
+# `indices` are the configs' positions in the full grid when searching a subset of it (default: configs is the grid)
+def run_search(fold_data, configs, epochs, device, n_workers, batched=False, keep_top_k=0, log=None, stopping=None, indices=None):
+  groups = group_configs(configs, batched)
+  indices = list(range(len(configs))) if indices is None else indices
+  if n_workers > 1:
+    return run_search_parallel(fold_data, configs, groups, epochs, n_workers, indices, keep_top_k, log, stopping)
+  return run_search_serial(fold_data, configs, groups, epochs, device, indices, keep_top_k, log, stopping)
+
+
+# (epochs, folds) per rung: epochs grow by `eta` from `min_epochs` up to the full budget, folds grow evenly to all of them
+def halving_budgets(epochs, num_folds, eta, min_epochs):
+  rung_epochs = []
+  current = min_epochs
+  while current < epochs:
+    rung_epochs.append(current)
+    current *= eta
+  rung_epochs.append(epochs)
+
+  rungs = len(rung_epochs)
+  return [(e, max(1, math.ceil(num_folds * (r + 1) / rungs))) for r, e in enumerate(rung_epochs)]
+
+
+# Successive halving: score every config on a small budget, keep the best 1/eta and promote them to the next budget.
+# Each config keeps the result of the last rung it reached; only configs in the final rung saw the full budget
+def successive_halving(X_data_tensor, y_data_tensor, folds, fold_data, configs, epochs, device, n_workers, batched=False, keep_top_k=0, log=None, stopping=None, eta=3, min_epochs=1):
+  budgets = halving_budgets(epochs, len(folds), eta, min_epochs)
+  results = [None] * len(configs)
+  survivors = list(range(len(configs)))
+
+  for rung, (rung_epochs, rung_folds) in enumerate(budgets):
+    print(f"Rung {rung + 1}/{len(budgets)}: {len(survivors)} configurations, {rung_epochs} epochs, {rung_folds} folds")
+    rung_configs = [configs[idx] for idx in survivors]
+    last_rung = rung == len(budgets) - 1
+    fold_results = run_search(fold_data[:rung_folds], rung_configs, rung_epochs, device, n_workers, batched, keep_top_k if last_rung else 0, log, stopping, survivors)
+
+    for idx, res in zip(survivors, fold_results):
+      results[idx] = summarize_config(configs[idx], res, folds[:rung_folds], len(X_data_tensor))
+      results[idx]['rung'] = rung
+      results[idx]['budget'] = {'epochs': rung_epochs, 'folds': rung_folds}
+
+    if rung < len(budgets) - 1:
+      ranked = sorted(survivors, key=lambda idx: -np.nan_to_num(results[idx]['avg_val_accuracy'], nan=-1.0))
+      survivors = ranked[:max(1, math.ceil(len(survivors) / eta))]
+
+  return results
+
+
+# n_workers > 1 spreads (config, fold) tasks over a CPU process pool; results match the serial path.
+# search_mode "halving" runs successive halving instead of training the full grid on the full budget.
+# batched=True trains configs that differ only in learning rate and dropout together (see group_configs).
+# Every result carries its out-of-fold probabilities ('oof_prob'); the best `keep_top_k` also carry their fold weights ('fold_models').
+# With checkpoint=True every finished (config, fold) is appended to a log keyed by the data, and a rerun on the same data
+# resumes from it; fresh=True discards that log first.
+# `stopping` ({"patience", "min_delta"}) ends each fold at its best validation loss, within hyperparameters['epochs'].
+# cv "walk_forward" scores each config over time-ordered windows of X (rows in date order, window_mode "expanding" or "sliding")
+# with one model trained forward through them (expanding) or a fresh model per window (sliding). It runs serially and keeps no
+# fold models, so it takes none of n_workers, batched, keep_top_k, stopping or halving (pass stopping=None); keep_top_k
+# defaults to 1 under k-fold
+def nn_cross_validate(X, y, X_match_id, write_db=True, n_workers=1, hyperparameters=HYPERPARAMETERS, search_mode="grid", batched=False, keep_top_k=None, checkpoint=True, fresh=False, stopping=EARLY_STOPPING, cv="kfold", window_mode="expanding"):
+  X_data_tensor = torch.as_tensor(X, dtype=torch.float32)
+  y_data_tensor = torch.as_tensor(y, dtype=torch.float32)
+
+  num_folds = 5
+  device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+  if cv == "walk_forward":
+    if search_mode == "halving":
+      raise ValueError("Successive halving is not supported with walk-forward validation")
+    if n_workers > 1 or batched:
+      raise ValueError("Walk-forward validation runs serially and unbatched; use n_workers=1 and batched=False")
+    if keep_top_k:
+      raise ValueError("Walk-forward validation keeps no fold models; leave keep_top_k unset")
+    if stopping is not None:
+      raise ValueError("Early stopping is not supported with walk-forward validation; pass stopping=None")
+    folds = walk_forward_windows(len(X_data_tensor), num_folds, window_mode)
+  else:
+    keep_top_k = 1 if keep_top_k is None else keep_top_k
+    kf = KFold(n_splits=num_folds, shuffle=True, random_state=42)
+    folds = list(kf.split(X_data_tensor, y_data_tensor))
+  fold_data = make_fold_data(X_data_tensor, y_data_tensor, folds, device) if cv != "walk_forward" else None
+
+  # The last fold's validation rows are saved like lr_model's test split, so a fused model is checked on real rows
+  X_test, y_test = np.asarray(X)[folds[-1][1]], np.asarray(y)[folds[-1][1]]
+  NN_MODEL_DIR.mkdir(parents=True, exist_ok=True)
+  np.savez(NN_MODEL_DIR / f"test_data_{getDateStamp()}.npz", X_test=X_test, y_test=y_test)
+
+  configs = search_space(hyperparameters)
+  # Batched groups and halving rungs share training noise between configs, so a result is only reused by the same kind of search
+  settings = {'stopping': stopping, 'batched': batched, 'search_mode': search_mode} if cv != "walk_forward" else {'stopping': stopping, 'walk_forward': window_mode}
+  if cv == "walk_forward" and window_mode == "sliding":
+    # Sliding results logged before each window got a fresh model matched the expanding ones and aren't reused
+    settings['fresh_per_window'] = True
+  log = SearchLog(search_log_path(dataset_hash(X, y, folds)), fresh=fresh, settings=settings) if checkpoint else None
+
+  if cv == "walk_forward":
+    print(f"\nStarting Hyperparameter Tuning with {num_folds} {window_mode} walk-forward windows.")
+  else:
+    print(f"\nStarting Hyperparameter Tuning with {num_folds}-Fold Cross-Validation.")
+
+  if cv == "walk_forward":
+    fold_results = run_walk_forward_search(X_data_tensor, y_data_tensor, folds, configs, hyperparameters['epochs'], device, log, window_mode)
+    all_configurations_results = [summarize_config(params, results, folds, len(X_data_tensor)) for params, results in zip(configs, fold_results)]
+  elif search_mode == "halving":
+    all_configurations_results = successive_halving(X_data_tensor, y_data_tensor, folds, fold_data, configs, hyperparameters['epochs'], device, n_workers, batched, keep_top_k, log, stopping)
+  else:
+    fold_results = run_search(fold_data, configs, hyperparameters['epochs'], device, n_workers, batched, keep_top_k, log, stopping)
+    all_configurations_results = [summarize_config(params, results, folds, len(X_data_tensor)) for params, results in zip(configs, fold_results)]
   
-  y_true_all_np = np.array(y_true_all)
-  y_prob_all_np = np.array(y_prob_all)
+  # Only compare configurations that were scored on the largest budget reached
+  top_rung = max(res.get('rung', 0) for res in all_configurations_results)
+  valid_results = [res for res in all_configurations_results if not np.isnan(res['avg_val_accuracy']) and res.get('rung', 0) == top_rung]
+
+  print("\nSorting configurations by descending Accuracy, then descending F1-Score...")
+  best_results_sorted = sorted(valid_results, key=lambda x: (-x['avg_val_accuracy']))
+
+  best_config_overall = best_results_sorted[0]
+  print(best_config_overall['avg_val_accuracy'])
+  if 'epochs' in best_config_overall:
+    print(f"Early stopping chose {best_config_overall['epochs']} epochs (folds: {best_config_overall['fold_epochs']})")
+  
+  # The search already holds the best config's out-of-fold predictions, so nothing is retrained for the plots.
+  # Rows no fold scored (the first walk-forward block) are left out
+  scored = ~np.isnan(best_config_overall['oof_prob'])
+  y_true_all_np = np.asarray(y, dtype=float)[scored]
+  y_prob_all_np = best_config_overall['oof_prob'][scored]
   y_pred_all = (y_prob_all_np > 0.5).astype(int)
 
   try:
@@ -206,6 +671,12 @@ def nn_cross_validate(X, y, X_match_id):
   for param_name, param_value in best_config_overall['params'].items():
     print(f"{param_name}: {param_value}")
 
+  if not write_db:
+    return best_config_overall, all_configurations_results
+
+  db = db_connect()
+  cursor = db.cursor()
+
   try:
     insert_model_metrics(cursor, "neural_network", best_config_overall)
     db.commit()
@@ -213,24 +684,21 @@ def nn_cross_validate(X, y, X_match_id):
     print("Error inserting model metrics:", e)
     db.rollback()
 
-  try:
-    for current_id, feature_vector in zip(X_match_id, X):
-      db_insert_feature_vector(cursor, current_id, "training", feature_vector, 2)
+  db_replace_training_feature_vectors(db, X_match_id, X, 2)
+  db.close()
 
-  except Exception as e:
-    print("Error inserting training feature vector:", e)
-    db.rollback()
-
-  finally:
-    db.commit()
-    db.close()
-
-  best_config_overall = None
   return best_config_overall, all_configurations_results
 
 
-def nn_train_final_model(X, y, best_params):
-  num_epochs_final_train=40
+# final_mode "ensemble" saves the best config's fold models (kept by nn_cross_validate) as one averaged model
+# instead of training a fresh one on the full data. A retrain runs for the epochs early stopping chose, if any
+def nn_train_final_model(X, y, best_params, final_mode="retrain"):
+  # Folds reused from a search log and walk-forward windows keep no weights, so there is nothing to ensemble
+  if final_mode == "ensemble" and 'fold_models' not in best_params:
+    raise ValueError("The best configuration has no fold models to ensemble (its folds came from the search log or walk-forward "
+                     "validation); rerun the search with --fresh and k-fold validation, or use --final retrain")
+
+  num_epochs_final_train = best_params.get('epochs', 40)
   X_tensor = torch.as_tensor(X, dtype=torch.float32)
   y_tensor = torch.as_tensor(y, dtype=torch.float32)
   device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -242,18 +710,75 @@ def nn_train_final_model(X, y, best_params):
   batch_size = best_params['params']['batch_size']
   optimizer = best_params['params']['optimizer']
 
-  final_model = MLP(X_tensor.shape[1], hidden_units, output_dim, dropout_rate).to(device)
-  criterion = nn.BCEWithLogitsLoss()
-  optimizer = (optim.Adam if optimizer == 'Adam' else optim.SGD)(final_model.parameters(), lr=lr)
+  if final_mode == "ensemble":
+    members = []
+    for state in best_params['fold_models']:
+      member = MLP(X_tensor.shape[1], hidden_units, output_dim, dropout_rate)
+      member.load_state_dict(state)
+      members.append(member)
+    final_model = FoldEnsemble(members).eval()
+
+  else:
+    final_model = MLP(X_tensor.shape[1], hidden_units, output_dim, dropout_rate).to(device)
+    criterion = nn.BCEWithLogitsLoss()
+    optimizer = (optim.Adam if optimizer == 'Adam' else optim.SGD)(final_model.parameters(), lr=lr)
 
-  full_dataset = TensorDataset(X_tensor, y_tensor)
-  effective_batch_size = max(1, min(batch_size, len(full_dataset)))
-  full_loader = DataLoader(full_dataset, batch_size=effective_batch_size, shuffle=True)
+    full_loader = TensorBatches(X_tensor.to(device), y_tensor.to(device), batch_size, shuffle=True)
 
-  for epoch in range(num_epochs_final_train):
-      epoch_loss = train_epoch(final_model, full_loader, criterion, optimizer, device)
+    for epoch in range(num_epochs_final_train):
+        epoch_loss = train_epoch(final_model, full_loader, criterion, optimizer, device)
 
   print("Final model training complete.")
   final_model_path = Path(__file__).resolve().parent / f"nn_model_data/nn_final_classifier_{getDateStamp()}.pkl"
 
-  save_object(final_model, final_model_path)
\ No newline at end of file
+  scaler = joblib.load(NN_MODEL_DIR / "standard_nn_scaler.pkl")
+  meta = {'mode': 'full', 'watermark': store_watermark("nn"), 'scaler': save_model_scaler(scaler, final_model_path), 'params': best_params['params']}
+  save_object(final_model, final_model_path)
+  save_model_meta(final_model_path, meta)
+  register_model("nn", "mlp", final_model, scaler, "nn", dict(meta, source_model=final_model_path.name))
+
+
+# Update mode: fine-tunes the latest final model for a few epochs on the matches after its watermark, mixed with a
+# replayed sample of older ones, and saves it as a new version. The base model's own scaler is kept as is
+def nn_update_model(snapshot=None, epochs=UPDATE_EPOCHS, replay=UPDATE_REPLAY):
+  model_path, meta = latest_model(NN_MODEL_DIR, "nn_final_classifier_*.pkl")
+  if model_path is None:
+    print("No trained neural network with metadata found, run a full training first")
+    return None
+
+  df = load_feature_frame("nn", snapshot)
+  watermark = pd.Timestamp(meta['watermark'])
+  is_new = (df['date'] > watermark).to_numpy()
+  if not is_new.any():
+    print(f"No matches after {watermark}, {model_path.name} is up to date")
+    return model_path
+
+  rng = np.random.default_rng(SEARCH_SEED)
+  old_rows = np.flatnonzero(~is_new)
+  replay_rows = rng.choice(old_rows, size=min(len(old_rows), replay * int(is_new.sum())), replace=False)
+  rows = np.concatenate([np.flatnonzero(is_new), replay_rows])
+  print(f"Fine-tuning {model_path.name} on {int(is_new.sum())} matches after {watermark} and {len(replay_rows)} replayed matches")
+
+  scaler = joblib.load(model_path.parent / meta['scaler'])
+  X = scaler.transform(df[NN_FEATURES].iloc[rows])
+  y = df['outcome'].iloc[rows].astype(int).to_numpy()
+
+  device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+  params = meta.get('params', {})
+  model = joblib.load(model_path).to(device)
+  criterion = nn.BCEWithLogitsLoss()
+  optimizer = (optim.SGD if params.get('optimizer') == 'SGD' else optim.Adam)(model.parameters(), lr=params.get('learning_rate', 0.001))
+  loader = TensorBatches(torch.as_tensor(X, dtype=torch.float32, device=device), torch.as_tensor(y, dtype=torch.float32, device=device), params.get('batch_size', 64), shuffle=True)
+
+  for epoch in range(epochs):
+    epoch_loss = train_epoch(model, loader, criterion, optimizer, device)
+    print(f"Epoch {epoch + 1}/{epochs} loss {epoch_loss:.4f}")
+
+  updated_path = NN_MODEL_DIR / f"nn_final_classifier_{getDateStamp()}_update.pkl"
+  meta = dict(meta, mode='update', watermark=store_watermark("nn"), scaler=save_model_scaler(scaler, updated_path), base_model=model_path.name)
+  save_object(model.cpu().eval(), updated_path)
+  save_model_meta(updated_path, meta)
+  register_model("nn", "mlp", model, scaler, "nn", dict(meta, source_model=updated_path.name))
+  print(f"Saved {updated_path.name}")
+
+  return updated_path
\ No newline at end of file
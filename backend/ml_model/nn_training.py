@@ -1,11 +1,48 @@
+import argparse
 from ml_util import process_matches_nn
-from nn_model import nn_cross_validate, nn_train_final_model
+from nn_model import nn_cross_validate, nn_train_final_model, nn_update_model, EARLY_STOPPING
+from model_registry import fuse_model, quantize_model
 
 
 def main():
-	X, y, df_match_id = process_matches_nn()
-	best_config_overall, all_configurations_results = nn_cross_validate(X, y, df_match_id)
-	nn_train_final_model(X, y, best_config_overall)
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--snapshot", help="Train from a snapshot directory written by snapshot.py instead of MySQL")
+	parser.add_argument("--workers", type=int, default=1, help="Processes for the hyperparameter search")
+	parser.add_argument("--search", choices=["grid", "halving"], default="grid", help="Full grid search or successive halving")
+	parser.add_argument("--batched", action="store_true", help="Train configurations sharing an architecture together")
+	parser.add_argument("--final", choices=["retrain", "ensemble"], default="retrain", help="Retrain the best config on all data or save its fold models as an ensemble")
+	parser.add_argument("--fresh", action="store_true", help="Discard the search log for this data instead of resuming from it")
+	parser.add_argument("--patience", type=int, help=f"Epochs without validation loss improvement before a fold stops (default {EARLY_STOPPING['patience']}); 0 trains the full budget")
+	parser.add_argument("--update", action="store_true", help="Fine-tune the latest final model on matches since its watermark instead of rerunning the search")
+	parser.add_argument("--cv", choices=["kfold", "walk_forward"], default="kfold", help="Shuffled k-fold or time-ordered walk-forward validation")
+	parser.add_argument("--window", choices=["expanding", "sliding"], default="expanding", help="Walk-forward training window")
+	parser.add_argument("--fuse", action="store_true", help="Also register the final model with the scaler folded into its first layer")
+	parser.add_argument("--quantize", action="store_true", help="Also register an int8 dynamically quantized copy of the final model and report its metric delta")
+	args = parser.parse_args()
+
+	if args.update:
+		nn_update_model(snapshot=args.snapshot)
+		if args.fuse:
+			fuse_model("nn")
+		if args.quantize:
+			quantize_model("nn")
+		return
+
+	if args.final == "ensemble" and args.cv == "walk_forward":
+		parser.error("--final ensemble needs k-fold models; walk-forward validation keeps none")
+	if args.cv == "walk_forward" and (args.workers > 1 or args.batched or args.search == "halving" or args.patience):
+		parser.error("walk-forward validation runs serially over the full grid without early stopping; drop --workers, --batched, --search halving and --patience")
+
+	patience = args.patience if args.patience is not None else (EARLY_STOPPING["patience"] if args.cv == "kfold" else 0)
+	stopping = dict(EARLY_STOPPING, patience=patience) if patience > 0 else None
+
+	X, y, df_match_id = process_matches_nn(snapshot=args.snapshot)
+	best_config_overall, all_configurations_results = nn_cross_validate(X, y, df_match_id, write_db=args.snapshot is None, n_workers=args.workers, search_mode=args.search, batched=args.batched, fresh=args.fresh, stopping=stopping, cv=args.cv, window_mode=args.window)
+	nn_train_final_model(X, y, best_config_overall, final_mode=args.final)
+	if args.fuse:
+		fuse_model("nn")
+	if args.quantize:
+		quantize_model("nn")
     
 if __name__ == "__main__":
 	main()
\ No newline at end of file
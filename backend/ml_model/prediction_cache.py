@@ -0,0 +1,43 @@
+import hashlib
+import joblib
+import numpy as np
+from pathlib import Path
+
+CACHE_DIR = Path(__file__).resolve().parent / "prediction_cache"
+
+# Features are rounded before hashing so float noise between runs doesn't count as a change
+HASH_DECIMALS = 9
+
+
+def feature_hashes(X):
+	X = np.round(np.asarray(X, dtype=np.float64), HASH_DECIMALS) + 0.0
+	return [hashlib.sha1(row.tobytes()).hexdigest() for row in X]
+
+
+# What was last written to match_predictions / live_feature_vectors for one model: match_id -> (model version,
+# feature hash). Rows whose version and features are unchanged don't need to be scored or written again
+class PredictionCache:
+	def __init__(self, name):
+		self.path = CACHE_DIR / f"{name}_predictions.pkl"
+		self.entries = {}
+		if self.path.exists():
+			try:
+				self.entries = joblib.load(self.path)
+			except Exception as e:
+				print("Error loading prediction cache, starting empty:", e)
+
+	# (mask of rows that are new or changed, feature hash of every row)
+	def pending(self, match_ids, version, X):
+		hashes = feature_hashes(X)
+		mask = np.array([self.entries.get(int(m)) != (version, h) for m, h in zip(match_ids, hashes)], dtype=bool)
+		return mask, hashes
+
+	# Call only once the rows are committed, so a failed write is retried next run
+	def update(self, match_ids, version, hashes):
+		for match_id, h in zip(match_ids, hashes):
+			self.entries[int(match_id)] = (version, h)
+
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		tmp_path = self.path.with_suffix(".tmp")
+		joblib.dump(self.entries, tmp_path)
+		tmp_path.replace(self.path)
@@ -0,0 +1,292 @@
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from ml_util import db_connect, db_cursor, db_write_live_predictions, get_pool
+from features import load_upcoming_matches, live_feature_frame, live_features
+from live_predict import LIVE_MODELS, load_live_models, load_live_indexes, load_window, predict_proba, score_live_models, write_live_models, live_reports
+from prediction_cache import PredictionCache
+
+SERVICE_HOST = os.getenv("PREDICTION_SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("PREDICTION_SERVICE_PORT", 8765))
+
+# Connections the service can hold at once: one per model batcher, one for reports and a few for handler threads
+# loading windows or reloading. Beyond that db_connect waits for one to be handed back
+SERVICE_DB_POOL_SIZE = int(os.getenv("PREDICTION_SERVICE_DB_POOL_SIZE", len(LIVE_MODELS) + 4))
+
+# Requests arriving within this many seconds of each other are scored as one batch
+BATCH_WINDOW = 0.005
+MAX_BATCH_REQUESTS = 256
+
+
+# Queues requests and hands them to `handler` in micro-batches: the first request waits at most `window` seconds
+# for others to join. handler(batch) gets a list of request payloads and returns one result per payload
+class MicroBatcher:
+	def __init__(self, handler, window=BATCH_WINDOW, max_requests=MAX_BATCH_REQUESTS):
+		self.handler = handler
+		self.window = window
+		self.max_requests = max_requests
+		self.queue = queue.Queue()
+		threading.Thread(target=self._run, daemon=True).start()
+
+	def submit(self, payload):
+		future = Future()
+		self.queue.put((payload, future))
+		return future.result()
+
+	def _run(self):
+		while True:
+			batch = [self.queue.get()]
+			deadline = time.monotonic() + self.window
+			while len(batch) < self.max_requests:
+				remaining = deadline - time.monotonic()
+				if remaining <= 0:
+					break
+				try:
+					batch.append(self.queue.get(timeout=remaining))
+				except queue.Empty:
+					break
+
+			try:
+				results = self.handler([payload for payload, future in batch])
+				for (payload, future), result in zip(batch, results):
+					future.set_result(result)
+			except Exception as e:
+				for payload, future in batch:
+					future.set_exception(e)
+
+
+# Keeps models, scalers and the team form / stats indexes in memory between requests.
+# reload() swaps in fresh copies; requests already scoring keep the objects they started with
+class PredictionService:
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.report_lock = threading.Lock()
+		# One prediction cache per model for the life of the service. cache_lock is held from the cache check through the
+		# write and cache update, so concurrent writes neither repeat each other's rows nor drop each other's entries
+		self.cache_lock = threading.Lock()
+		self.caches = {key: PredictionCache(key) for key in LIVE_MODELS}
+		self.models = {}
+		self.form = None
+		self.stats_index = None
+		self.batchers = {key: MicroBatcher(lambda batch, key=key: self._score_batch(key, batch)) for key in LIVE_MODELS}
+		self.reload()
+
+	# Each model resolves to its newest compatible registry version unless `versions` pins one. A model that can't be
+	# loaded (e.g. nothing registered yet) is skipped and keeps whatever version was loaded before, if any
+	def reload(self, keys=None, versions=None):
+		keys = keys or list(LIVE_MODELS)
+		loaded = {}
+		for key in keys:
+			try:
+				loaded.update(load_live_models([key], versions))
+			except (OSError, ValueError) as e:
+				print(f"Error opening {key} model:", e)
+
+		with db_cursor() as cursor:
+			form, stats_index = load_live_indexes(cursor)
+
+		with self.lock:
+			self.models.update(loaded)
+			self.form = form
+			self.stats_index = stats_index
+
+		print("Loaded models: " + (", ".join(f"{key} (v{slot['version']})" for key, slot in loaded.items()) or "none"))
+		return {key: self.models[key]["version"] if key in self.models else None for key in keys}
+
+	def loaded(self, key):
+		with self.lock:
+			return key in self.models
+
+	# One feature pass, one transform and one predict call for every match id in the batch
+	def _score_batch(self, key, batch):
+		with self.lock:
+			slot = self.models[key]
+			form, stats_index = self.form, self.stats_index
+
+		match_ids = sorted({int(match_id) for payload in batch for match_id in payload["match_ids"]})
+		today = datetime.now().date()
+
+		with db_cursor() as cursor:
+			df = load_upcoming_matches(cursor, match_ids=match_ids)
+		scored_ids, X = live_features(live_feature_frame(df, form, stats_index, today), key)
+
+		# A fused model scores raw rows, so scaling is only needed to record feature vectors for writes
+		writes = any(payload.get("write") for payload in batch)
+		scores = {}
+		if len(scored_ids) > 0:
+			X_scaled = slot["scaler"].transform(X) if writes or not slot["fused"] else None
+			probs = predict_proba(slot["model"], X if slot["fused"] else X_scaled)
+			for row, (match_id, prob) in enumerate(zip(scored_ids, probs)):
+				prediction = int(prob >= 0.5)
+				scores[int(match_id)] = (prediction, float(prob if prediction == 1 else 1 - prob), row)
+
+		# Matches already written with the same model version and features are left alone
+		write_ids = sorted({int(match_id) for payload in batch if payload.get("write") for match_id in payload["match_ids"] if int(match_id) in scores})
+		if write_ids:
+			with self.cache_lock:
+				self._write_batch(key, slot, write_ids, scores, X, X_scaled)
+
+		return [
+			[{"match_id": int(m), "prediction": scores[int(m)][0], "confidence": scores[int(m)][1]} for m in payload["match_ids"] if int(m) in scores]
+			for payload in batch
+		]
+
+	def _write_batch(self, key, slot, write_ids, scores, X, X_scaled):
+		cache = self.caches[key]
+		pending, hashes = cache.pending(write_ids, slot["version"], [X[scores[m][2]] for m in write_ids])
+		hashes = [h for h, p in zip(hashes, pending) if p]
+		write_ids = [m for m, p in zip(write_ids, pending) if p]
+		if not write_ids:
+			return
+
+		db = db_connect()
+		try:
+			written = db_write_live_predictions(
+				db, write_ids, [X_scaled[scores[m][2]] for m in write_ids],
+				[scores[m][0] for m in write_ids], [scores[m][1] for m in write_ids], LIVE_MODELS[key]["model_id"]
+			)
+		finally:
+			db.close()
+		if not written:
+			raise RuntimeError(f"Writing {key} predictions failed, nothing was saved")
+		cache.update(write_ids, slot["version"], hashes)
+
+	def predict_matches(self, key, match_ids, write=False):
+		return self.batchers[key].submit({"match_ids": list(match_ids), "write": write})
+
+	# Upcoming matches dated within live_predict.WINDOW_DAYS, written to the database like the nightly scripts.
+	# With reports=True the live graphs are redrawn afterwards
+	def predict_window(self, key, write=True, reports=False):
+		today = datetime.now().date()
+		with db_cursor() as cursor:
+			window = load_window(cursor, today)
+
+		predictions = self.predict_matches(key, window['match_id'].tolist(), write=write)
+		if reports:
+			self._reports([key])
+		return predictions
+
+	# Nightly pass: one feature frame for the window shared by every loaded model, only new or changed matches
+	# scored, and all models' predictions written in one transaction. Returns what was written per model; a failed
+	# write raises, so the request answers 500 and the caller can fall back to live_predict.py
+	def predict_all(self, reports=False):
+		with self.lock:
+			models = dict(self.models)
+			form, stats_index = self.form, self.stats_index
+
+		today = datetime.now().date()
+		with db_cursor() as cursor:
+			window = load_window(cursor, today)
+
+		frame = live_feature_frame(window, form, stats_index, today)
+		with self.cache_lock:
+			scored = score_live_models(frame, models, self.caches)
+
+			db = db_connect()
+			try:
+				written = write_live_models(db, scored, models, self.caches)
+			finally:
+				db.close()
+		if not written:
+			raise RuntimeError("Writing live predictions failed, nothing was saved")
+
+		if reports:
+			self._reports(list(models))
+
+		return {
+			key: [{"match_id": int(m), "prediction": int(p), "confidence": float(c)} for m, p, c in zip(s["match_ids"], s["predictions"], s["confidences"])]
+			for key, s in scored.items()
+		}
+
+	# Predictions are already committed here, so a failed graph doesn't fail the request
+	def _reports(self, keys):
+		with self.report_lock:
+			db = db_connect()
+			try:
+				for key in keys:
+					live_reports(db, key)
+			except Exception as e:
+				print("Error drawing live reports:", e)
+			finally:
+				db.close()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+	service = None
+
+	def _send(self, status, body):
+		payload = json.dumps(body).encode()
+		self.send_response(status)
+		self.send_header("Content-Type", "application/json")
+		self.send_header("Content-Length", str(len(payload)))
+		self.end_headers()
+		self.wfile.write(payload)
+
+	def do_GET(self):
+		if self.path == "/health":
+			self._send(200, {"status": "ok", "models": {key: slot["version"] for key, slot in self.service.models.items()}})
+		else:
+			self._send(404, {"error": "Not found"})
+
+	def do_POST(self):
+		try:
+			length = int(self.headers.get("Content-Length", 0))
+			body = json.loads(self.rfile.read(length) or b"{}")
+
+			if self.path == "/reload":
+				keys = [body["model"]] if body.get("model") else None
+				self._send(200, {"models": self.service.reload(keys, body.get("versions"))})
+				return
+
+			if self.path == "/predict/all":
+				if not self.service.models:
+					self._send(503, {"error": "No models are loaded"})
+					return
+				self._send(200, {"predictions": self.service.predict_all(reports=body.get("reports", False))})
+				return
+
+			key = body.get("model")
+			if key not in LIVE_MODELS:
+				self._send(400, {"error": f"Unknown model: {key}"})
+				return
+			if self.path in ("/predict/window", "/predict/matches") and not self.service.loaded(key):
+				self._send(503, {"error": f"Model {key} is not loaded"})
+				return
+
+			if self.path == "/predict/window":
+				predictions = self.service.predict_window(key, write=body.get("write", True), reports=body.get("reports", False))
+			elif self.path == "/predict/matches":
+				predictions = self.service.predict_matches(key, body.get("match_ids", []), write=body.get("write", False))
+			else:
+				self._send(404, {"error": "Not found"})
+				return
+
+			self._send(200, {"model": key, "predictions": predictions})
+
+		except Exception as e:
+			print("Error handling request:", e)
+			self._send(500, {"error": str(e)})
+
+	def log_message(self, format, *args):
+		print(f"{self.command} {self.path} {args[1] if len(args) > 1 else ''}")
+
+
+def main():
+	get_pool(SERVICE_DB_POOL_SIZE)
+	PredictionHandler.service = PredictionService()
+	server = ThreadingHTTPServer((SERVICE_HOST, SERVICE_PORT), PredictionHandler)
+	print(f"Prediction service listening on http://{SERVICE_HOST}:{SERVICE_PORT}", flush=True)
+
+	try:
+		server.serve_forever()
+	finally:
+		server.server_close()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,84 @@
+import hashlib
+import json
+import os
+import pickle
+import numpy as np
+from pathlib import Path
+
+SEARCH_LOG_DIR = Path(__file__).resolve().parent / "nn_model_data" / "search_log"
+
+
+# Identifies the training data and fold split, so a log is only reused for the exact same search input
+def dataset_hash(X, y, folds):
+	digest = hashlib.sha256()
+	digest.update(np.ascontiguousarray(X, dtype=np.float32).tobytes())
+	digest.update(np.ascontiguousarray(y, dtype=np.float32).tobytes())
+	for train_index, val_index in folds:
+		digest.update(np.asarray(val_index, dtype=np.int64).tobytes())
+	return digest.hexdigest()[:16]
+
+
+def search_log_path(data_hash):
+	return SEARCH_LOG_DIR / f"{data_hash}.pkl"
+
+
+def result_key(params, epochs, fold, settings=None):
+	payload = json.dumps({'params': params, 'epochs': epochs, 'fold': fold, 'settings': settings}, sort_keys=True)
+	return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Append-only log of finished (config, fold) results: one pickled (key, result) record per entry,
+# flushed to disk as soon as it is written. A record torn by a crash is dropped on the next load.
+# Fold model weights are not logged, so results restored from the log carry none.
+# `settings` (e.g. early stopping) is part of every key, so changing it doesn't reuse old results
+class SearchLog:
+	def __init__(self, path, fresh=False, settings=None):
+		self.path = Path(path)
+		self.settings = settings
+		self.path.parent.mkdir(parents=True, exist_ok=True)
+		self.results = {}
+
+		if fresh and self.path.exists():
+			self.path.unlink()
+		if self.path.exists():
+			self._load()
+
+	def _load(self):
+		good_offset = 0
+		with open(self.path, "rb") as f:
+			while True:
+				try:
+					key, result = pickle.load(f)
+				except EOFError:
+					break
+				except Exception as e:
+					print("Dropping torn search log record:", e)
+					break
+				self.results[key] = result
+				good_offset = f.tell()
+
+		# Cut any partial record so new appends start on a clean boundary
+		if good_offset < self.path.stat().st_size:
+			with open(self.path, "r+b") as f:
+				f.truncate(good_offset)
+
+		print(f"Loaded {len(self.results)} finished (configuration, fold) results from {self.path}")
+
+	def __len__(self):
+		return len(self.results)
+
+	def get(self, params, epochs, fold):
+		result = self.results.get(result_key(params, epochs, fold, self.settings))
+		return None if result is None else result + (None,)
+
+	# Stores (accuracy, loss, roc_auc, confusion_matrix, val_probs, chosen epochs); weights are left out
+	def append(self, params, epochs, fold, result):
+		key = result_key(params, epochs, fold, self.settings)
+		record = tuple(result[:4]) + (np.asarray(result[4], dtype=np.float32), result[5])
+
+		with open(self.path, "ab") as f:
+			pickle.dump((key, record), f)
+			f.flush()
+			os.fsync(f.fileno())
+
+		self.results[key] = record
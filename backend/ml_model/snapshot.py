@@ -0,0 +1,107 @@
+import datetime
+import json
+import numpy as np
+import pandas as pd
+from pathlib import Path
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent / "snapshot"
+
+SNAPSHOT_TABLES = ["matches", "team_stats_by_date", "upcoming_matches"]
+
+NULL_PREFIX = "__null__"
+
+
+def _is_temporal(series):
+	if pd.api.types.is_datetime64_any_dtype(series):
+		return True
+	values = series.dropna()
+	return len(values) > 0 and isinstance(values.iloc[0], (datetime.date, datetime.datetime))
+
+
+# One plain array per column: datetime64 for dates, float/int for numbers, fixed-width unicode for text.
+# Text columns carry a separate null mask so NULL round-trips without pickling object arrays
+def _column_arrays(name, series):
+	if _is_temporal(series):
+		return {name: pd.to_datetime(series).to_numpy(dtype='datetime64[ns]')}
+
+	numeric = pd.to_numeric(series, errors='coerce')
+	if numeric.notna().sum() == series.notna().sum():
+		if series.notna().all() and (numeric % 1 == 0).all():
+			return {name: numeric.to_numpy(dtype=np.int64)}
+		return {name: numeric.to_numpy(dtype=float)}
+
+	nulls = series.isna().to_numpy()
+	return {
+		name: np.array(series.where(~nulls, "").astype(str).tolist(), dtype=str),
+		NULL_PREFIX + name: nulls
+	}
+
+
+def export_table(cursor, table, path):
+	cursor.execute(f"SELECT * FROM {table}")
+	columns = [col[0] for col in cursor.description]
+	df = pd.DataFrame(cursor.fetchall(), columns=columns)
+
+	arrays = {}
+	for col in columns:
+		arrays.update(_column_arrays(col, df[col]))
+
+	np.savez_compressed(path / f"{table}.npz", **arrays)
+	return columns, len(df)
+
+
+def export_snapshot(db, path=SNAPSHOT_DIR):
+	print("Exporting database snapshot...")
+	path = Path(path)
+	path.mkdir(parents=True, exist_ok=True)
+
+	cursor = db.cursor()
+
+	manifest = {"exported_at": datetime.datetime.now().isoformat(), "tables": {}}
+
+	try:
+		for table in SNAPSHOT_TABLES:
+			columns, rows = export_table(cursor, table, path)
+			manifest["tables"][table] = {"columns": columns, "rows": rows}
+	finally:
+		cursor.close()
+
+	with open(path / "manifest.json", "w") as f:
+		json.dump(manifest, f, indent=4)
+
+	print(f"Snapshot written to {path}")
+
+
+def load_table(table, path=SNAPSHOT_DIR):
+	path = Path(path)
+	with open(path / "manifest.json") as f:
+		columns = json.load(f)["tables"][table]["columns"]
+
+	with np.load(path / f"{table}.npz") as data:
+		df = pd.DataFrame({col: data[col] for col in columns})
+		for col in columns:
+			if NULL_PREFIX + col in data:
+				df[col] = df[col].astype(object).where(~data[NULL_PREFIX + col], None)
+
+	return df
+
+
+# Same frames as features.load_matches / load_team_stats, read from the snapshot instead of MySQL
+def load_snapshot_matches(path=SNAPSHOT_DIR, since=None):
+	df = load_table("matches", path)
+	df = df.sort_values(['date', 'match_id'], kind='stable').reset_index(drop=True)
+	if since is not None:
+		df = df[df['date'] > pd.Timestamp(since)].reset_index(drop=True)
+	return df
+
+
+def load_snapshot_team_stats(path=SNAPSHOT_DIR):
+	return load_table("team_stats_by_date", path)
+
+
+if __name__ == "__main__":
+	from ml_util import db_connect
+
+	db = db_connect()
+	export_snapshot(db)
+	db.close()
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+
+FORM_COLUMNS = ['team_rating', 'avg_kda', 'avg_kast', 'avg_adr']
+
+FORM_WINDOW = 10
+
+
+# One row per team appearance in `matches`, ordered by team then time
+def team_appearances(matches):
+	sides = []
+	for side in ('a', 'b'):
+		sides.append(pd.DataFrame({
+			'_row': np.arange(len(matches)),
+			'side': side,
+			'team': matches[f'team_{side}'].to_numpy(),
+			'date': matches['date'].to_numpy(),
+			'match_id': matches['match_id'].to_numpy(),
+			'team_rating': matches[f'team_{side}_rating'].to_numpy(),
+			'avg_kda': matches[f'team_{side}_kda'].to_numpy(),
+			'avg_kast': matches[f'team_{side}_kast'].to_numpy(),
+			'avg_adr': matches[f'team_{side}_adr'].to_numpy()
+		}))
+
+	long = pd.concat(sides, ignore_index=True)
+	for col in FORM_COLUMNS:
+		long[col] = pd.to_numeric(long[col], errors='coerce').astype(float)
+
+	return long.sort_values(['team', 'date', 'match_id'], kind='stable').reset_index(drop=True)
+
+
+class TeamForm:
+	# `history` holds earlier appearances (see tail()) so form can continue past matches that are no longer loaded
+	def __init__(self, matches, window=FORM_WINDOW, history=None):
+		self.window = window
+		self.matches = matches.reset_index(drop=True)
+		self.appearances = team_appearances(self.matches)
+
+		if history is not None and len(history) > 0:
+			history = history[['team', 'date', 'match_id'] + FORM_COLUMNS].assign(_row=-1, side=None)
+			self.appearances = pd.concat([history, self.appearances], ignore_index=True)
+			self.appearances = self.appearances.sort_values(['team', 'date', 'match_id'], kind='stable').reset_index(drop=True)
+
+		# Mean of the last `window` appearances up to and including each row. AVG-style: NULLs are skipped
+		rolling = self.appearances.groupby('team', sort=False)[FORM_COLUMNS].rolling(window, min_periods=1).mean()
+		self.through = rolling.reset_index(level=0, drop=True).sort_index()
+
+		# Strictly-prior form is the running mean as of the team's previous appearance
+		self.prior = self.through.groupby(self.appearances['team'], sort=False).shift(1)
+
+		self._teams = {}
+		for team, idx in self.appearances.groupby('team', sort=False).indices.items():
+			self._teams[team] = (self.appearances['date'].to_numpy()[idx], idx)
+
+	# Form of each side going into every row of `matches`
+	def for_matches(self):
+		form = {}
+		order = np.arange(len(self.matches))
+		for side in ('a', 'b'):
+			mask = (self.appearances['side'] == side).to_numpy()
+			part = self.prior[mask].set_index(self.appearances.loc[mask, '_row'].to_numpy()).reindex(order)
+			form[side] = part.reset_index(drop=True)
+		return form
+
+	# Last `window` appearances of every team, enough to seed a later TeamForm
+	def tail(self):
+		columns = ['team', 'date', 'match_id'] + FORM_COLUMNS
+		return self.appearances.groupby('team', sort=False).tail(self.window)[columns].reset_index(drop=True)
+
+	# Form from the team's last appearances strictly before `dates`, one row per (team, date) pair
+	def as_of_many(self, teams, dates):
+		dates = pd.to_datetime(pd.Series(dates)).to_numpy()
+		result = np.full((len(dates), len(FORM_COLUMNS)), np.nan)
+		through = self.through.to_numpy()
+
+		for i, (team, date) in enumerate(zip(teams, dates)):
+			if team not in self._teams:
+				continue
+			team_dates, idx = self._teams[team]
+			pos = np.searchsorted(team_dates, date, side='left')
+			if pos > 0:
+				result[i] = through[idx[pos - 1]]
+
+		return pd.DataFrame(result, columns=FORM_COLUMNS)
+
+	def as_of(self, team, date):
+		row = self.as_of_many([team], [date]).iloc[0]
+		if row.isna().all():
+			return None
+		return {col: (None if pd.isna(val) else val) for col, val in row.items()}
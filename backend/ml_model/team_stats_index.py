@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+TEAM_STAT_COLUMNS = [
+	'ranking', 'round_wr', 'opening_kill_rate', 'multikill_rate', '5v4_wr', '4v5_wr',
+	'trade_rate', 'utility_adr', 'flash_assists', 'pistol_wr', 'round2_conv', 'round2_break'
+]
+
+
+class TeamStatsIndex:
+	def __init__(self, team_stats):
+		df = team_stats.dropna(subset=['team_name', 'date']).copy()
+		df['date'] = pd.to_datetime(df['date'])
+		for col in TEAM_STAT_COLUMNS:
+			df[col] = pd.to_numeric(df[col], errors='coerce').astype(float)
+		df = df.sort_values(['team_name', 'date'], kind='stable').reset_index(drop=True)
+
+		# Snapshot dates as int64 nanoseconds, one sorted slice per team into a single stat block
+		self.dates = df['date'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+		self.stats = df[TEAM_STAT_COLUMNS].to_numpy(dtype=float)
+		self.teams = {
+			team: (idx[0], idx[-1] + 1)
+			for team, idx in df.groupby('team_name', sort=False).indices.items()
+		}
+
+	# Row into self.stats for each date of one team, or -1 when there is no usable snapshot
+	def _positions(self, team, dates, direction):
+		start, end = self.teams[team]
+		team_dates = self.dates[start:end]
+		pos = np.searchsorted(team_dates, dates, side='right')
+
+		before = np.clip(pos - 1, 0, None)
+		if direction == "backward":
+			return np.where(pos > 0, start + before, -1)
+
+		after = np.clip(pos, None, len(team_dates) - 1)
+		pick_after = np.abs(team_dates[after] - dates) < np.abs(dates - team_dates[before])
+		return start + np.where(pick_after, after, before)
+
+	# Stats for many (team, date) pairs; direction is "nearest" (closest snapshot) or "backward" (latest at or before)
+	def lookup_many(self, teams, dates, direction="nearest"):
+		teams = pd.Series(teams).reset_index(drop=True)
+		dates = pd.to_datetime(pd.Series(dates)).reset_index(drop=True)
+		result = np.full((len(teams), len(TEAM_STAT_COLUMNS)), np.nan)
+
+		valid = dates.notna().to_numpy()
+		keys = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+		for team, idx in teams[valid].groupby(teams[valid], sort=False).indices.items():
+			if team not in self.teams:
+				continue
+			rows = np.flatnonzero(valid)[idx]
+			positions = self._positions(team, keys[rows], direction)
+			found = positions >= 0
+			result[rows[found]] = self.stats[positions[found]]
+
+		return pd.DataFrame(result, columns=TEAM_STAT_COLUMNS)
+
+	def lookup(self, team, date, direction="nearest"):
+		row = self.lookup_many([team], [date], direction).iloc[0]
+		if row.isna().all():
+			return None
+		return {col: (None if pd.isna(val) else val) for col, val in row.items()}
@@ -0,0 +1,59 @@
+import sys
+import numpy as np
+import pytest
+from pathlib import Path
+
+# The ml_model modules import each other by bare name, as when run as scripts from that directory
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+# A registry and test data directories of its own for each test
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+	import model_registry
+	monkeypatch.setattr(model_registry, "REGISTRY_DIR", tmp_path / "model_registry")
+	monkeypatch.setattr(model_registry, "TEST_DATA_DIRS", {"lr": tmp_path / "lr_model_data", "nn": tmp_path / "nn_model_data"})
+	return tmp_path
+
+
+# Raw rows on very different scales (rankings vs rates), a scaler fit on them and labels a model can learn.
+# Returned by the training_data fixture as training_data(feature_set, rows=600, seed=0)
+def _training_data(feature_set, rows=600, seed=0):
+	from sklearn.preprocessing import StandardScaler
+	from features import FEATURE_SETS
+
+	rng = np.random.default_rng(seed)
+	num_features = len(FEATURE_SETS[feature_set])
+	X = rng.normal(size=(rows, num_features)) * rng.uniform(0.01, 50, num_features) + rng.uniform(-20, 20, num_features)
+	scaler = StandardScaler().fit(X)
+	X_scaled = scaler.transform(X)
+	y = (X_scaled @ rng.normal(size=num_features) + rng.normal(size=rows) > 0).astype(int)
+	return X, X_scaled, y, scaler
+
+
+# A small MLP fit on (X_scaled, y), returned in eval mode; skips the test without torch
+def _fit_mlp(X_scaled, y):
+	torch = pytest.importorskip("torch")
+	from models.mlp import MLP
+
+	torch.manual_seed(0)
+	model = MLP(X_scaled.shape[1], [32, 16], 1, 0.0)
+	optimizer = torch.optim.Adam(model.parameters(), lr=0.01)
+	X_tensor = torch.as_tensor(X_scaled, dtype=torch.float32)
+	y_tensor = torch.as_tensor(y, dtype=torch.float32)
+	for _ in range(50):
+		optimizer.zero_grad()
+		loss = torch.nn.functional.binary_cross_entropy_with_logits(model(X_tensor).view(-1), y_tensor)
+		loss.backward()
+		optimizer.step()
+	return model.eval()
+
+
+@pytest.fixture
+def training_data():
+	return _training_data
+
+
+@pytest.fixture
+def fit_mlp():
+	return _fit_mlp
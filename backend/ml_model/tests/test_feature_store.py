@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+import feature_store
+from features import TEAM_STAT_COLUMNS, build_features
+from feature_store import update_feature_store
+
+TEAMS = [f"team{i}" for i in range(12)]
+START = pd.Timestamp("2024-01-01")
+
+
+# Matches spread over 40 weeks between 12 teams, and weekly (Monday) snapshots of every team but the last; one
+# team's snapshots only start in week 32, after most of its matches were played
+def synthetic_data(num_matches=700, seed=0):
+	rng = np.random.default_rng(seed)
+	rows = []
+	for match_id in range(1, num_matches + 1):
+		team_a, team_b = rng.choice(TEAMS, 2, replace=False)
+		row = {
+			'match_id': match_id, 'date': START + pd.Timedelta(minutes=int(rng.integers(0, 40 * 7 * 24 * 60))),
+			'tournament_type': int(rng.integers(0, 3)), 'best_of': int(rng.choice([1, 3, 5])),
+			'team_a': team_a, 'team_b': team_b, 'outcome': int(rng.integers(0, 2))
+		}
+		for side in ('a', 'b'):
+			row[f'team_{side}_rating'] = float(rng.normal(1, 0.1))
+			row[f'team_{side}_kda'] = float(rng.normal(1, 0.2))
+			row[f'team_{side}_kast'] = float(rng.normal(70, 5))
+			row[f'team_{side}_adr'] = float(rng.normal(75, 5))
+		rows.append(row)
+	matches = pd.DataFrame(rows).sort_values(['date', 'match_id'], kind='stable').reset_index(drop=True)
+
+	snapshots = []
+	for team_idx, team in enumerate(TEAMS[:-1]):
+		for week in range(32 if team_idx == 0 else 0, 41):
+			snapshot = {'team_name': team, 'date': START + pd.Timedelta(weeks=week, hours=int(rng.integers(0, 12)))}
+			snapshot.update({col: float(rng.normal(10, 3)) for col in TEAM_STAT_COLUMNS})
+			snapshots.append(snapshot)
+	return matches, pd.DataFrame(snapshots)
+
+
+# Serves update_feature_store's snapshot loaders from in-memory (matches, team_stats) pairs keyed by "directory"
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+	sources = {}
+
+	def load_matches(path, since=None):
+		matches = sources[path][0]
+		return matches[matches['date'] > pd.Timestamp(since)].reset_index(drop=True) if since is not None else matches
+
+	monkeypatch.setattr(feature_store, "STORE_DIR", tmp_path)
+	monkeypatch.setattr(feature_store, "load_snapshot_matches", load_matches)
+	monkeypatch.setattr(feature_store, "load_snapshot_team_stats", lambda path: sources[path][1])
+	return sources
+
+
+def assert_same_features(stored, expected):
+	pd.testing.assert_frame_equal(stored.reset_index(drop=True), expected.reset_index(drop=True), check_dtype=False)
+
+
+@pytest.mark.parametrize("feature_set", ["lr", "nn"])
+def test_incremental_build_matches_full_build_when_snapshots_arrive_between_runs(store, feature_set):
+	matches, team_stats = synthetic_data()
+	split = matches['date'].iloc[500]
+	store['first'] = (matches[matches['date'] < split], team_stats[team_stats['date'] < split - pd.Timedelta(days=6)])
+	store['second'] = (matches, team_stats)
+
+	first = update_feature_store(None, feature_set, snapshot='first')
+	assert_same_features(first, build_features(*store['first'], feature_set))
+
+	second = update_feature_store(None, feature_set, snapshot='second')
+	assert_same_features(second, build_features(matches, team_stats, feature_set))
+
+
+@pytest.mark.parametrize("feature_set", ["lr", "nn"])
+def test_incremental_build_matches_full_build_after_a_backdated_match(store, feature_set):
+	matches, team_stats = synthetic_data()
+	late = matches.index == 351
+	store['first'] = (matches.iloc[:600][~late[:600]], team_stats)
+	store['second'] = (matches, team_stats)
+
+	update_feature_store(None, feature_set, snapshot='first')
+	second = update_feature_store(None, feature_set, snapshot='second')
+	assert_same_features(second, build_features(matches, team_stats, feature_set))
+
+
+def test_unchanged_sources_are_not_refeaturized(store, monkeypatch):
+	matches, team_stats = synthetic_data()
+	store['all'] = (matches, team_stats)
+	first = update_feature_store(None, "lr", snapshot='all')
+
+	monkeypatch.setattr(feature_store, "featurize_matches", lambda *args: pytest.fail("nothing changed"))
+	assert_same_features(update_feature_store(None, "lr", snapshot='all'), first)
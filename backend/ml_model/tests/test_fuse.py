@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+import model_registry
+from model_registry import FUSE_TOLERANCE, build_model, build_scaler, fuse_model, load_arrays, predict_proba, register_model, resolve, verification_data
+
+
+# Saved the way lr_model.lr_train_model / nn_model.nn_cross_validate do: scaled rows in test_data_<date>.npz
+def save_test_data(registry, feature_set, X_scaled, y):
+	path = registry / f"{feature_set}_model_data"
+	path.mkdir(parents=True, exist_ok=True)
+	np.savez(path / "test_data_01-01-2025.npz", X_test=X_scaled, y_test=y)
+
+
+def trained_probs(model, X_scaled):
+	if isinstance(model, LogisticRegression):
+		return model.predict_proba(X_scaled)[:, 1]
+
+	import torch
+	with torch.no_grad():
+		return torch.sigmoid(model(torch.as_tensor(X_scaled, dtype=torch.float32))).view(-1).double().numpy()
+
+
+def fitted_model(kind, X_scaled, y, fit_mlp):
+	if kind == "logistic_regression":
+		return LogisticRegression(max_iter=1000).fit(X_scaled, y)
+	return fit_mlp(X_scaled, y)
+
+
+@pytest.mark.parametrize("feature_set, kind", [("lr", "logistic_regression"), ("nn", "mlp")])
+def test_fused_model_matches_scaler_then_model_on_saved_test_data(registry, training_data, fit_mlp, feature_set, kind):
+	X, X_scaled, y, scaler = training_data(feature_set)
+	model = fitted_model(kind, X_scaled[:400], y[:400], fit_mlp)
+	save_test_data(registry, feature_set, X_scaled[400:], y[400:])
+	register_model(feature_set, kind, model, scaler, feature_set)
+
+	fused = fuse_model(feature_set)
+	assert fused['fused'] and fused['fused_from'] == 1
+	assert fused['fused_max_diff'] <= FUSE_TOLERANCE
+
+	base = resolve(feature_set, feature_set, 1)
+	base_model = build_model(kind, load_arrays(base, 'model'))
+	base_scaler = build_scaler(load_arrays(base, 'scaler'))
+	fused_model = build_model(kind, load_arrays(fused, 'model'))
+
+	two_step = predict_proba(base_model, base_scaler.transform(X[400:]))
+	np.testing.assert_allclose(predict_proba(fused_model, X[400:]), two_step, rtol=0, atol=FUSE_TOLERANCE)
+	# ...and the two-step registry path is the trained model itself
+	np.testing.assert_allclose(two_step, trained_probs(model, X_scaled[400:]), rtol=0, atol=1e-6)
+
+
+@pytest.mark.parametrize("feature_set", ["lr", "nn"])
+def test_verification_data_maps_saved_test_split_back_to_raw_rows(registry, training_data, feature_set):
+	X, X_scaled, y, scaler = training_data(feature_set)
+	save_test_data(registry, feature_set, X_scaled[400:], y[400:])
+
+	np.testing.assert_allclose(verification_data(feature_set, scaler), X[400:], rtol=1e-9, atol=1e-9)
+
+
+def test_fuse_rejects_model_that_does_not_match(registry, training_data, fit_mlp, monkeypatch):
+	X, X_scaled, y, scaler = training_data("lr")
+	register_model("lr", "logistic_regression", fitted_model("logistic_regression", X_scaled, y, fit_mlp), scaler, "lr")
+	save_test_data(registry, "lr", X_scaled, y)
+
+	fold_scaler = model_registry.fold_scaler
+	monkeypatch.setattr(model_registry, "fold_scaler", lambda kind, model_arrays, scaler_arrays: {
+		key: value * 1.5 if key == 'coef' else value for key, value in fold_scaler(kind, model_arrays, scaler_arrays).items()
+	})
+	with pytest.raises(ValueError):
+		fuse_model("lr")
+	assert [m['version'] for m in model_registry.list_versions("lr")] == [1]
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import model_registry
+from model_registry import fuse_model, load_registered_model, quantize_model, register_model, resolve
+
+pytest.importorskip("torch")
+import live_predict
+import mlp_quantized
+
+
+@pytest.fixture
+def mlp(registry, training_data, fit_mlp):
+	X, X_scaled, y, scaler = training_data("nn")
+	model = fit_mlp(X_scaled[:400], y[:400])
+	register_model("nn", "mlp", model, scaler, "nn")
+	return X, y, model, scaler
+
+
+def test_quantized_copy_records_metric_deltas_and_is_only_resolved_on_request(mlp):
+	X, y, model, scaler = mlp
+	quantized = quantize_model("nn", X_raw=X[400:], y=y[400:])
+
+	assert quantized['quantized'] == "int8" and quantized['quantized_from'] == 1
+	metrics = quantized['quantization']
+	assert abs(metrics['accuracy_delta']) < 0.05 and abs(metrics['roc_auc_delta']) < 0.05
+	assert resolve("nn", "nn")['version'] == 1
+
+	int8_model, _, manifest = load_registered_model("nn", "nn", quantized=True)
+	assert manifest['version'] == 2 and isinstance(int8_model, mlp_quantized.QuantizedMLP)
+	np.testing.assert_allclose(int8_model.predict_proba(scaler.transform(X[400:])), float_probs(X[400:]), atol=0.2)
+
+
+def float_probs(X):
+	model, scaler, _ = load_registered_model("nn", "nn")
+	return model_registry.predict_proba(model, scaler.transform(X))
+
+
+def test_int8_follows_fused_base_but_not_a_newer_float_version(mlp, monkeypatch):
+	X, y, model, scaler = mlp
+	quantize_model("nn", X_raw=X[400:], y=y[400:])
+	fuse_model("nn", 1)
+	assert resolve("nn", "nn", quantized=True)['quantized_from'] == 1
+
+	register_model("nn", "mlp", model, scaler, "nn")
+	with pytest.raises(FileNotFoundError):
+		resolve("nn", "nn", quantized=True)
+
+	monkeypatch.setattr(live_predict, "NN_INFERENCE", "int8")
+	assert live_predict.load_live_models(["nn"])["nn"]["version"] == 4
+
+
+def test_live_models_fall_back_to_float_without_quantization_support(mlp, monkeypatch):
+	X, y, model, scaler = mlp
+	quantize_model("nn", X_raw=X[400:], y=y[400:])
+
+	monkeypatch.setattr(live_predict, "NN_INFERENCE", "int8")
+	assert live_predict.load_live_models(["nn"])["nn"]["version"] == 2
+	monkeypatch.setattr(mlp_quantized, "DynamicQuantizedLinear", None)
+	assert live_predict.load_live_models(["nn"])["nn"]["version"] == 1
@@ -0,0 +1,51 @@
+import pickle
+import numpy as np
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from sklearn.model_selection import KFold
+from nn_model import make_fold_data, run_search, search_space
+from search_log import SearchLog
+
+HYPERPARAMETERS = {'dropout': [0.1, 0.3], 'learning_rate': [0.01, 0.001], 'batch_size': [32], 'hidden_units': [[8]], 'optimizer': ['Adam']}
+
+
+@pytest.fixture
+def fold_data():
+	rng = np.random.default_rng(0)
+	X = rng.normal(size=(120, 6))
+	y = (X[:, 0] + rng.normal(size=120) > 0).astype(int)
+	folds = list(KFold(n_splits=3, shuffle=True, random_state=42).split(X))
+	return make_fold_data(torch.as_tensor(X, dtype=torch.float32), torch.as_tensor(y, dtype=torch.float32), folds, torch.device("cpu"))
+
+
+def assert_same_results(actual, expected):
+	for config_actual, config_expected in zip(actual, expected):
+		for res_actual, res_expected in zip(config_actual, config_expected):
+			assert res_actual[:2] == pytest.approx(res_expected[:2], abs=1e-6)
+			np.testing.assert_allclose(res_actual[4], res_expected[4], atol=1e-6)
+
+
+@pytest.mark.parametrize("batched", [False, True])
+def test_resumed_search_matches_fresh_search(tmp_path, fold_data, batched):
+	configs = search_space(HYPERPARAMETERS)
+	fresh = run_search(fold_data, configs, 2, torch.device("cpu"), 1, batched, log=SearchLog(tmp_path / "fresh.pkl"))
+
+	# Keep a prefix of the fresh log that ends partway through a batched group, as a crash mid-write would
+	with open(tmp_path / "fresh.pkl", "rb") as f:
+		records = [pickle.load(f) for _ in range(len(configs) * len(fold_data))]
+	with open(tmp_path / "resumed.pkl", "wb") as f:
+		for record in records[:len(configs) + 1]:
+			pickle.dump(record, f)
+
+	resumed = run_search(fold_data, configs, 2, torch.device("cpu"), 1, batched, log=SearchLog(tmp_path / "resumed.pkl"))
+	assert_same_results(resumed, fresh)
+
+
+def test_config_result_does_not_depend_on_the_configs_searched_with_it(fold_data):
+	configs = search_space(HYPERPARAMETERS)
+	full = run_search(fold_data, configs, 2, torch.device("cpu"), 1)
+	# As a later halving rung, where the config is the only survivor
+	alone = run_search(fold_data, configs[3:], 2, torch.device("cpu"), 1, indices=[3])
+	assert_same_results(alone, full[3:])
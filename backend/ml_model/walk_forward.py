@@ -0,0 +1,29 @@
+import numpy as np
+
+WALK_FORWARD_WINDOWS = 5
+
+
+# (train_index, val_index) pairs over date-ordered rows. The rows are cut into n_windows + 1 contiguous blocks;
+# window k is validated on block k + 1 and trained on every earlier block ("expanding") or the last `train_blocks` ("sliding")
+def walk_forward_windows(num_rows, n_windows=WALK_FORWARD_WINDOWS, mode="expanding", train_blocks=1):
+	if mode not in ("expanding", "sliding"):
+		raise ValueError(f"Unknown walk-forward mode: {mode}")
+
+	bounds = np.linspace(0, num_rows, n_windows + 2).astype(int)
+	windows = []
+	for k in range(n_windows):
+		start = 0 if mode == "expanding" else bounds[max(0, k + 1 - train_blocks)]
+		windows.append((np.arange(start, bounds[k + 1]), np.arange(bounds[k + 1], bounds[k + 2])))
+
+	return windows
+
+
+# Rows each window adds to its training set on top of the previous window, for models that keep training across windows
+def new_train_rows(windows):
+	seen_until = 0
+	added = []
+	for train_index, val_index in windows:
+		added.append(train_index[train_index >= seen_until])
+		seen_until = train_index[-1] + 1
+
+	return added
@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 from datetime import datetime, timedelta
 import mysql.connector
+from mysql.connector import pooling
 
 def load_teams(cursor):
     query = """
@@ -36,20 +37,40 @@ def cookie_accept(driver):
         print("Error accepting cookies:", e)
 
         
+_pool = None
+
+
+def _db_config():
+	env_path = Path(__file__).resolve().parent.parent / '.env'
+	load_dotenv(env_path)
+
+	return {
+		"host": os.getenv("DB_HOST"),
+		"user": os.getenv("DB_USER"),
+		"password": os.getenv("DB_PASSWORD"),
+		"database": os.getenv("DB_NAME")
+	}
+
+
+# One pool per process; the .env file is read once when it is created
+def get_pool():
+	global _pool
+	if _pool is None:
+		# _db_config loads .env, so it has to run before DB_POOL_SIZE is read
+		config = _db_config()
+		_pool = pooling.MySQLConnectionPool(
+			pool_name="scraper",
+			pool_size=int(os.getenv("DB_POOL_SIZE", 2)),
+			**config
+		)
+	return _pool
+
+
+# Connections are borrowed from the pool; close() hands them back warm instead of disconnecting
 def db_connect():
 	try:
-		env_path = Path(__file__).resolve().parent.parent / '.env'
-		load_dotenv(env_path)
-
-		db = mysql.connector.connect(
-			host=os.getenv("DB_HOST"),
-			user=os.getenv("DB_USER"),
-			password=os.getenv("DB_PASSWORD"),
-			database=os.getenv("DB_NAME")
-		)
-	
-		return db
+		return get_pool().get_connection()
 
 	except mysql.connector.Error as e:
 		print("Database connection error:", e)
-		return None
\ No newline at end of file
+		return None
@@ -1,7 +1,7 @@
 import cron from 'node-cron';
 import path from 'path';
 import { fileURLToPath } from 'url';
-import runPythonScript from '../util/pyRunner.js';
+import runPythonScript, { requestPrediction } from '../util/pyRunner.js';
 import logger from '../util/logger.js';
 
 const __filename = fileURLToPath(import.meta.url);
@@ -14,11 +14,19 @@ const scheduleDailyUpdates = () => {
       const um_path = path.resolve(__dirname, '..', '..', 'scraper', 'upcomingMatches.py');
       await runPythonScript(um_path, 'upcomingMatches.py');
 
-      const lrp_path = path.resolve(__dirname, '..', '..', 'ml_model', 'lr_predict.py');
-      await runPythonScript(lrp_path, 'lr_predict.py');
-
-      const nnp_path = path.resolve(__dirname, '..', '..', 'ml_model', 'nn_predict.py');
-      await runPythonScript(nnp_path, 'nn_predict.py');
+      // Pick up today's results in the resident service's feature indexes, then score every model there in one
+      // pass. If the service can't, the standalone pipeline script does the same pass
+      try {
+        await requestPrediction('/reload');
+        const result = await requestPrediction('/predict/all', { reports: true });
+        for (const [model, predictions] of Object.entries(result.predictions)) {
+          logger.info(`prediction_service wrote ${predictions.length} ${model} predictions`);
+        }
+      } catch (serviceError) {
+        logger.warn({ error: serviceError.message }, 'Prediction service unavailable, running live_predict.py instead');
+        const script_path = path.resolve(__dirname, '..', '..', 'ml_model', 'live_predict.py');
+        await runPythonScript(script_path, 'live_predict.py');
+      }
 
       logger.info('All daily prediction scripts completed successfully.');
     } catch (error) {
@@ -2,6 +2,12 @@ import app from './app.js';
 import logger from './util/logger.js';
 import { connectDb } from './config/db.js';
 import startAllCronJobs from './cron/index.js';
+import path from 'path';
+import { fileURLToPath } from 'url';
+import { startPredictionService } from './util/pyRunner.js';
+
+const __filename = fileURLToPath(import.meta.url);
+const __dirname = path.dirname(__filename);
 
 const PORT = process.env.PORT || 3000;
 
@@ -11,5 +17,6 @@ app.listen(PORT, () => {
   logger.info(`Server is running on http://localhost:${PORT}`);
   logger.debug('Debug mode is active.');
 
+  startPredictionService(path.resolve(__dirname, '..', 'ml_model', 'prediction_service.py'));
   startAllCronJobs();
 });
\ No newline at end of file
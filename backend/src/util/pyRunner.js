@@ -1,6 +1,12 @@
 import { spawn } from 'child_process';
+import http from 'http';
 import logger from './logger.js';
 
+const SERVICE_HOST = process.env.PREDICTION_SERVICE_HOST || '127.0.0.1';
+const SERVICE_PORT = process.env.PREDICTION_SERVICE_PORT || 8765;
+// A request with no response for this long is abandoned, so callers can fall back instead of hanging
+const SERVICE_TIMEOUT_MS = Number(process.env.PREDICTION_SERVICE_TIMEOUT_MS) || 10 * 60 * 1000;
+
 
 /**
  * Runs python scripts
@@ -37,4 +43,78 @@ function runPythonScript(scriptPath, scriptName) {
   });
 }
 
+/**
+ * Starts the resident prediction service (ml_model/prediction_service.py), which keeps models
+ * and feature indexes loaded between requests
+ *
+ * @param {string} scriptPath - Absolute path of prediction_service.py.
+ */
+function startPredictionService(scriptPath) {
+  logger.info(`Starting prediction service (${scriptPath})`);
+  const serviceProcess = spawn('python', ['-u', scriptPath], {
+    env: { ...process.env, PREDICTION_SERVICE_HOST: SERVICE_HOST, PREDICTION_SERVICE_PORT: String(SERVICE_PORT) },
+  });
+
+  serviceProcess.stdout.on('data', (data) => {
+    logger.info(`prediction_service (stdout): ${data.toString().trim()}`);
+  });
+
+  serviceProcess.stderr.on('data', (data) => {
+    logger.error(`prediction_service (stderr): ${data.toString().trim()}`);
+  });
+
+  serviceProcess.on('close', (code) => {
+    logger.warn(`prediction_service exited with code ${code}`);
+  });
+
+  serviceProcess.on('error', (err) => {
+    logger.error('prediction_service failed to start:', err);
+  });
+
+  return serviceProcess;
+}
+
+/**
+ * Sends a command to the prediction service
+ *
+ * @param {string} route - '/predict/all', '/predict/window', '/predict/matches' or '/reload'.
+ * @param {object} body - JSON body, e.g. { model: 'lr', match_ids: [1, 2] }.
+ * @param {number} timeoutMs - Milliseconds of socket inactivity before the request is rejected.
+ */
+function requestPrediction(route, body = {}, timeoutMs = SERVICE_TIMEOUT_MS) {
+  return new Promise((resolve, reject) => {
+    const payload = JSON.stringify(body);
+    const req = http.request({
+      host: SERVICE_HOST,
+      port: SERVICE_PORT,
+      path: route,
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json', 'Content-Length': Buffer.byteLength(payload) },
+    }, (res) => {
+      let data = '';
+      res.on('data', (chunk) => { data += chunk; });
+      res.on('end', () => {
+        try {
+          const parsed = JSON.parse(data);
+          if (res.statusCode === 200) {
+            resolve(parsed);
+          } else {
+            reject(new Error(`prediction_service ${route} failed (${res.statusCode}): ${parsed.error}`));
+          }
+        } catch (err) {
+          reject(err);
+        }
+      });
+    });
+
+    req.setTimeout(timeoutMs, () => {
+      req.destroy(new Error(`prediction_service ${route} timed out after ${timeoutMs} ms`));
+    });
+    req.on('error', reject);
+    req.write(payload);
+    req.end();
+  });
+}
+
+export { startPredictionService, requestPrediction };
 export default runPythonScript;
\ No newline at end of file